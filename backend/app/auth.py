@@ -1,4 +1,9 @@
+import asyncio
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -8,6 +13,7 @@ from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
 from .database import get_db
+from .metrics import counter, gauge, histogram
 from . import models
 
 SECURE_COOKIES = os.getenv("SECURE_COOKIES", "false").lower() == "true"
@@ -15,6 +21,15 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "dev_secret_key_change_me")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 
+# bcrypt runs on its own pool so login bursts can't starve the request threadpool
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Hash jobs allowed to wait for a worker before new ones are refused with 503
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "16"))
+
+# Detached User rows kept per process for get_current_user; 0 disables
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
@@ -26,6 +41,89 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+HASH_SECONDS = histogram(
+    "password_hash_seconds", "Time spent in bcrypt per call", ("op",),
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0),
+)
+HASH_WAIT_SECONDS = histogram(
+    "password_hash_queue_wait_seconds", "Time hash jobs waited for a worker", ("op",),
+)
+HASH_QUEUE_DEPTH = gauge("password_hash_queue_depth", "Hash jobs waiting for a worker")
+HASH_IN_FLIGHT = gauge("password_hash_in_flight", "Hash jobs accepted and not yet finished")
+HASH_REJECTED = counter("password_hash_rejected_total", "Hash jobs refused because the pool was full", ("op",))
+
+
+class PasswordHasher:
+    """
+    Size-limited executor for bcrypt. At most `workers` hashes run at once
+    and at most `max_queue` more wait; anything beyond that is rejected
+    immediately with a 503 instead of queueing behind the burst.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+
+    def _run(self, job: "_HashJob", fn, *args):
+        job.started = True
+        HASH_QUEUE_DEPTH.dec()
+        started = time.perf_counter()
+        HASH_WAIT_SECONDS.observe(started - job.submitted, op=job.op)
+        try:
+            return fn(*args)
+        finally:
+            HASH_SECONDS.observe(time.perf_counter() - started, op=job.op)
+
+    def _finished(self, job: "_HashJob") -> None:
+        # Also runs for jobs cancelled before a worker picked them up (the
+        # client went away, or shutdown with cancel_futures)
+        if not job.started:
+            HASH_QUEUE_DEPTH.dec()
+        HASH_IN_FLIGHT.dec()
+        self._slots.release()
+
+    async def submit(self, op: str, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            HASH_REJECTED.inc(op=op)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many sign-in attempts right now. Try again shortly.",
+                headers={"Retry-After": "1"},
+            )
+        HASH_IN_FLIGHT.inc()
+        HASH_QUEUE_DEPTH.inc()
+        job = _HashJob(op)
+        try:
+            future = self._executor.submit(self._run, job, fn, *args)
+        except BaseException:
+            self._finished(job)
+            raise
+        # The slot is held until the job itself is done, not just until the
+        # awaiting request gives up on it
+        future.add_done_callback(lambda _: self._finished(job))
+        return await asyncio.wrap_future(future)
+
+
+class _HashJob:
+    __slots__ = ("op", "submitted", "started")
+
+    def __init__(self, op: str):
+        self.op = op
+        self.submitted = time.perf_counter()
+        self.started = False
+
+
+password_hasher = PasswordHasher()
+
+
+async def hash_password_async(password: str) -> str:
+    return await password_hasher.submit("hash", get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.submit("verify", verify_password, plain_password, hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (
@@ -54,10 +152,7 @@ def clear_auth_cookie(response: Response) -> None:
     response.delete_cookie(key="access_token", path="/")
 
 
-def get_current_user(
-    request: Request,
-    db: Session = Depends(get_db),
-) -> models.User:
+def _decode_token(request: Request) -> dict:
     token = request.cookies.get("access_token")
     if not token:
         raise HTTPException(
@@ -67,19 +162,106 @@ def get_current_user(
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise JWTError()
-    except JWTError:
+        payload["sub"] = int(payload["sub"])
+        return payload
+    except (JWTError, KeyError, TypeError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token",
         )
 
-    user = db.query(models.User).filter(models.User.id == int(user_id)).first()
+
+def get_token_user_id(request: Request) -> int:
+    """User id from the access token cookie, 401 if missing or invalid."""
+    return _decode_token(request)["sub"]
+
+
+class Principal:
+    """
+    The authenticated caller as stated by the signed token. Enough for
+    routes that only scope queries by user id; no database access.
+    """
+
+    __slots__ = ("id", "username")
+
+    def __init__(self, id: int, username: Optional[str] = None):
+        self.id = id
+        self.username = username
+
+
+def get_current_principal(request: Request) -> Principal:
+    payload = _decode_token(request)
+    return Principal(payload["sub"], payload.get("username"))
+
+
+class UserCache:
+    """
+    Bounded LRU of detached User rows with a TTL, so repeated requests from
+    the same user skip the users lookup. Entries are dropped explicitly by
+    invalidate_user() when an account changes; other worker processes only
+    see such changes once their entry expires.
+    """
+
+    def __init__(self, max_size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[models.User]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[1] >= self.ttl:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[0]
+
+    def put(self, user: models.User) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[user.id] = (user, time.monotonic())
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+user_cache = UserCache()
+
+
+def invalidate_user(user_id: int) -> None:
+    """Call after changing or deleting a user row."""
+    user_cache.invalidate(user_id)
+
+
+def user_not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="User not found",
+    )
+
+
+def get_current_user(
+    request: Request,
+    db: Session = Depends(get_db),
+) -> models.User:
+    """Full User row for routes that need more than the id (cached, detached)."""
+    user_id = get_token_user_id(request)
+
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-        )
+        raise user_not_found()
+    db.expunge(user)
+    user_cache.put(user)
     return user
@@ -0,0 +1,7 @@
+"""
+Reproducible benchmarks on synthetic data.
+
+- synthetic: deterministic catalogs (10k-1M movies) and users (0-10k ratings)
+- run: latency percentiles, SQL statements and memory per function and mode
+- compare: diff two JSON reports, e.g. from two commits
+"""
@@ -0,0 +1,61 @@
+"""
+Compare two benchmark reports written by app.benchmarks.run.
+
+    python -m app.benchmarks.compare base.json new.json [--metric p95_ms] [--threshold 1.2]
+
+Prints every (benchmark, user size) found in both reports with the base and
+new value of --metric and their ratio. With --threshold, exits with
+status 1 if any ratio is above it.
+"""
+
+import argparse
+import json
+from typing import Dict, Tuple
+
+
+def load_results(path: str) -> Tuple[dict, Dict[Tuple[str, int], dict]]:
+    with open(path) as f:
+        report = json.load(f)
+    return report, {(r["benchmark"], r["user_ratings"]): r for r in report["results"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports.")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--metric", default="p95_ms")
+    parser.add_argument("--threshold", type=float, default=None, help="fail if new/base exceeds this")
+    args = parser.parse_args()
+
+    base_report, base = load_results(args.base)
+    new_report, new = load_results(args.new)
+
+    if base_report.get("settings") != new_report.get("settings"):
+        print(f"Note: settings differ: {base_report.get('settings')} vs {new_report.get('settings')}")
+    if base_report.get("catalog") != new_report.get("catalog"):
+        print(f"Note: catalogs differ: {base_report.get('catalog')} vs {new_report.get('catalog')}")
+
+    print(
+        f"{'benchmark':<16} {'ratings':>8} {'base':>10} {'new':>10} {'ratio':>7}"
+        f"   ({args.metric}, {(base_report.get('git_commit') or '?')[:8]} -> "
+        f"{(new_report.get('git_commit') or '?')[:8]})"
+    )
+    regressions = []
+    for key in sorted(set(base) & set(new)):
+        before, after = base[key][args.metric], new[key][args.metric]
+        ratio = after / before if before else float("inf")
+        flag = ""
+        if args.threshold is not None and ratio > args.threshold:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        print(f"{key[0]:<16} {key[1]:>8} {before:>10.2f} {after:>10.2f} {ratio:>6.2f}x{flag}")
+
+    for key in sorted(set(base) ^ set(new)):
+        print(f"{key[0]:<16} {key[1]:>8} only in {'base' if key in base else 'new'}")
+
+    if regressions:
+        raise SystemExit(f"{len(regressions)} benchmarks regressed beyond {args.threshold}x.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Synthetic catalogs and users for benchmarks and checks.
+
+The generator is deterministic for a given (size, seed), so two runs on
+different commits see the same catalog:
+
+- embeddings are 128-dim unit vectors drawn around SYNTHETIC_CLUSTERS
+  centers, so nearest-neighbour and profile scoring behave like on real
+  data instead of on uniform noise;
+- imdb_votes are log-normal (median a few hundred, a long tail into the
+  millions) and imdb_rating is roughly normal around 6.4, with a few
+  percent of each left NULL like in the real TSV;
+- the catalog is generated and COPY-loaded chunk by chunk through the
+  initialize_db COPY path, so 1M movies don't need 1M rows in memory.
+
+Users rate popular movies more often than obscure ones and like better-rated
+ones more often; their ratings are spaced one minute apart so the profile
+window is well defined.
+"""
+
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+from sqlalchemy import insert, select, text
+from sqlalchemy.orm import Session
+
+from .. import auth, models
+from ..database import engine
+from ..profiles import EMBEDDING_DIM, rebuild_user_profile
+from ..vector_index import ensure_embedding_index
+
+SYNTHETIC_CLUSTERS = 64
+SYNTHETIC_CHUNK_ROWS = 2000
+NULL_FRACTION = 0.03
+GENRES = ("Drama", "Comedy", "Action", "Thriller", "Romance", "Horror", "Documentary", "Animation")
+
+
+def _centers(seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((SYNTHETIC_CLUSTERS, EMBEDDING_DIM))
+    return centers / np.linalg.norm(centers, axis=1, keepdims=True)
+
+
+def synthetic_chunk(start: int, count: int, seed: int, centers: np.ndarray) -> Dict[str, np.ndarray]:
+    """Columns for movies start..start+count-1; the same for the same arguments."""
+    rng = np.random.default_rng([seed, start])
+    cluster = rng.integers(0, len(centers), count)
+    emb = centers[cluster] + 0.6 * rng.standard_normal((count, EMBEDDING_DIM)) / np.sqrt(EMBEDDING_DIM)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+
+    votes = np.minimum(np.exp(rng.normal(6.0, 2.2, count)), 3_000_000).astype(np.int64)
+    rating = np.clip(rng.normal(6.4, 1.0, count) + 0.1 * np.log10(votes + 1), 1.0, 10.0).round(1)
+    return {
+        "index": np.arange(start, start + count),
+        "year": rng.integers(1920, 2026, count),
+        "votes": votes,
+        "votes_null": rng.random(count) < NULL_FRACTION,
+        "rating": rating,
+        "rating_null": rng.random(count) < NULL_FRACTION,
+        "genre": rng.integers(0, len(GENRES), count),
+        "embedding": emb.astype(np.float32),
+    }
+
+
+def synthetic_copy_chunks(n_movies: int, seed: int) -> Iterator[Tuple[str, int]]:
+    """COPY text for COPY_COLUMNS, one chunk at a time."""
+    centers = _centers(seed)
+    for start in range(0, n_movies, SYNTHETIC_CHUNK_ROWS):
+        cols = synthetic_chunk(start, min(SYNTHETIC_CHUNK_ROWS, n_movies - start), seed, centers)
+        lines = []
+        for i in range(len(cols["index"])):
+            n = int(cols["index"][i])
+            embedding = "[" + ",".join(f"{x:.6f}" for x in cols["embedding"][i]) + "]"
+            lines.append("\t".join((
+                f"Synthetic Movie {n}",
+                str(int(cols["year"][i])),
+                r"\N" if cols["rating_null"][i] else str(float(cols["rating"][i])),
+                r"\N" if cols["votes_null"][i] else str(int(cols["votes"][i])),
+                f"Synthetic overview {n}.",
+                GENRES[int(cols["genre"][i])],
+                r"\N",
+                embedding,
+            )))
+        yield "".join(line + "\n" for line in lines), len(lines)
+
+
+def load_synthetic_catalog(n_movies: int, seed: int = 7) -> int:
+    """
+    COPY a synthetic catalog into an empty movies table (scores are filled
+    in the same transaction) and build the embedding index. Returns rows
+    loaded (0 if the table wasn't empty).
+    """
+    from ..scripts.initialize_db import copy_chunks_into_movies
+
+    # Benchmarks and checks run against a scratch database nothing serves from
+    loaded = copy_chunks_into_movies(synthetic_copy_chunks(n_movies, seed), offline=True)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE movies"))
+    with engine.begin() as conn:
+        ensure_embedding_index(conn)
+    return loaded
+
+
+def create_synthetic_user(
+    db: Session,
+    n_ratings: int,
+    n_favorites: int = 0,
+    seed: int = 7,
+) -> Tuple[models.User, Dict[int, bool]]:
+    """
+    A fresh user with `n_ratings` ratings and `n_favorites` favorites (taken
+    from their liked movies), profile built. Returns the user (expunged) and
+    their ratings, newest first.
+    """
+    rng = np.random.default_rng(seed)
+    name = f"synthetic_{uuid.uuid4().hex[:10]}"
+    user = models.User(
+        username=name,
+        email=f"{name}@example.com",
+        password_hash=auth.get_password_hash(name),
+    )
+    db.add(user)
+    db.flush()
+
+    ratings: Dict[int, bool] = {}
+    if n_ratings > 0:
+        ids, votes, imdb = (
+            np.asarray(col, dtype=np.float64)
+            for col in zip(*db.execute(
+                select(models.Movie.id, models.Movie.imdb_votes, models.Movie.imdb_rating)
+            ).all())
+        )
+        popularity = np.sqrt(np.nan_to_num(votes, nan=0.0) + 1.0)
+        n_ratings = min(n_ratings, len(ids))
+        picked = rng.choice(len(ids), size=n_ratings, replace=False, p=popularity / popularity.sum())
+        liked_p = 1.0 / (1.0 + np.exp(-(np.nan_to_num(imdb[picked], nan=6.0) - 6.5)))
+        liked = rng.random(n_ratings) < liked_p
+        ratings = {int(ids[i]): bool(like) for i, like in zip(picked, liked)}
+
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                "user_id": user.id,
+                "movie_id": movie_id,
+                "rating": rating,
+                "created_at": now - timedelta(minutes=i),
+            }
+            for i, (movie_id, rating) in enumerate(ratings.items())
+        ]
+        for start in range(0, len(rows), 5000):
+            db.execute(insert(models.Rating), rows[start:start + 5000])
+
+    favorites: List[int] = [mid for mid, rating in ratings.items() if rating][:n_favorites]
+    if favorites:
+        db.execute(insert(models.Favorite), [
+            {"user_id": user.id, "movie_id": movie_id} for movie_id in favorites
+        ])
+
+    rebuild_user_profile(db, user.id)
+    db.commit()
+    db.refresh(user)
+    db.expunge(user)
+    return user, ratings
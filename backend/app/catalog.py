@@ -0,0 +1,140 @@
+"""
+Helpers for in-process structures derived from the movie catalog.
+
+The catalog is loaded in the background after the API starts (see
+entrypoint.sh) and can be reloaded or rescored later, so anything cached
+from it needs a cheap way to notice that it changed.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Generic, Optional, Tuple, TypeVar
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal, in_async_session
+
+CATALOG_CHECK_SECONDS = float(os.getenv("CATALOG_CHECK_SECONDS", "60"))
+
+# catalog_meta key of the counter bumped by scoring.refresh_movie_scores
+SCORES_VERSION_KEY = "scores_version"
+# catalog_meta key of the counter bumped by a trigger whenever movies are
+# inserted, deleted or have their embedding updated (see app/migrations.py)
+EMBEDDINGS_VERSION_KEY = "embeddings_version"
+
+CatalogVersion = Tuple[int, ...]
+T = TypeVar("T")
+
+
+def catalog_version(db: Session) -> CatalogVersion:
+    """(row count, max id) of the movies table. One aggregate query, no embeddings."""
+    count, max_id = db.execute(
+        select(func.count(models.Movie.id), func.coalesce(func.max(models.Movie.id), 0))
+    ).one()
+    return int(count), int(max_id)
+
+
+def _meta_value(key: str):
+    return func.coalesce(
+        select(models.CatalogMeta.value).where(models.CatalogMeta.key == key).scalar_subquery(),
+        0,
+    )
+
+
+def scored_catalog_version(db: Session) -> CatalogVersion:
+    """
+    (row count, max id, embeddings version, scores version): also changes
+    when embeddings are updated in place or the stored movie scores are
+    recomputed. Still one query.
+    """
+    count, max_id, embeddings, scores = db.execute(
+        select(
+            func.count(models.Movie.id),
+            func.coalesce(func.max(models.Movie.id), 0),
+            _meta_value(EMBEDDINGS_VERSION_KEY),
+            _meta_value(SCORES_VERSION_KEY),
+        )
+    ).one()
+    return int(count), int(max_id), int(embeddings), int(scores)
+
+
+class CatalogCache(Generic[T]):
+    """
+    Holds one value built from the catalog and rebuilds it when the catalog
+    version changes. The version is re-checked at most every `check_seconds`
+    with `read_version` (catalog_version, or scored_catalog_version for
+    values that hold movie scores).
+
+    While a rebuild is running, other callers keep getting the previous value
+    instead of queueing behind the lock. Only a cold cache makes them wait.
+
+    Callers inside AsyncSession.run_sync never take the lock: they run on
+    the event loop, where waiting for it could deadlock against a build
+    that needs the loop to finish its queries. The check and any rebuild
+    are handed to a background thread with its own session, and they get
+    the current value meanwhile (None while cold, so they fall back to SQL).
+    """
+
+    def __init__(
+        self,
+        build: Callable[[Session, CatalogVersion], Optional[T]],
+        check_seconds: float = CATALOG_CHECK_SECONDS,
+        read_version: Callable[[Session], CatalogVersion] = catalog_version,
+    ):
+        self._build = build
+        self._read_version = read_version
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._background: Optional[threading.Thread] = None
+        self._background_lock = threading.Lock()
+        self._value: Optional[T] = None
+        self._version: Optional[CatalogVersion] = None
+        self._checked_at = float("-inf")
+
+    def _fresh(self) -> bool:
+        return time.monotonic() - self._checked_at < self.check_seconds
+
+    def get(self, db: Session) -> Optional[T]:
+        if self._fresh():
+            return self._value
+        if in_async_session():
+            self._refresh_in_background()
+            return self._value
+        return self._check(db)
+
+    def _check(self, db: Session) -> Optional[T]:
+        if not self._lock.acquire(blocking=self._value is None):
+            return self._value
+        try:
+            if self._fresh():
+                return self._value
+
+            version = self._read_version(db)
+            if version != self._version:
+                self._value = self._build(db, version) if version[0] else None
+                self._version = version
+            self._checked_at = time.monotonic()
+            return self._value
+        finally:
+            self._lock.release()
+
+    def _refresh_in_background(self) -> None:
+        with self._background_lock:
+            if self._background is not None and self._background.is_alive():
+                return
+            self._background = threading.Thread(
+                target=self._refresh_with_own_session, name="catalog-cache", daemon=True,
+            )
+            self._background.start()
+
+    def _refresh_with_own_session(self) -> None:
+        with SessionLocal() as db:
+            self._check(db)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._checked_at = float("-inf")
+            self._version = None
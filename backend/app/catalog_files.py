@@ -0,0 +1,268 @@
+"""
+Columnar on-disk export of the movie catalog.
+
+An export is a directory:
+
+    manifest.json          format, row count, embedding dim, id range
+    id.npy                 int32, ascending
+    startYear.npy          int32, NULL_INT where NULL
+    imdb_rating.npy        float64, NaN where NULL
+    imdb_votes.npy         int64, NULL_INT where NULL
+    embedding.npy          float32 [count, dim], NaN rows where NULL
+    <text>.offsets.npy     int64 [count + 1] into <text>.utf8
+    <text>.valid.npy       bool, False where NULL
+    <text>.utf8            concatenated UTF-8 values
+
+for the text columns title, overview, tmdb_genres and poster_path. Every
+.npy file is a plain NumPy array, so readers open them with
+np.load(mmap_mode="r") and get zero-copy views instead of parsing floats.
+
+An export written with since_id > 0 is a delta: it holds only the movies
+with id > since_id, and applying it on top of the earlier export (or
+database) brings it up to max_id.
+"""
+
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from sqlalchemy import func, select
+from sqlalchemy.engine import Connection
+
+from . import models
+
+# 2: imdb_rating is float64 (format 1 stored it as float32, which is lossy)
+EXPORT_FORMAT = 2
+EMBEDDING_DIM = 128
+NULL_INT = int(np.iinfo(np.int32).min)
+
+NUMERIC_COLUMNS = {
+    "startYear": np.int32,
+    "imdb_rating": np.float64,
+    "imdb_votes": np.int64,
+}
+TEXT_COLUMNS = ("title", "overview", "tmdb_genres", "poster_path")
+
+
+def _movie_columns():
+    return [
+        models.Movie.id,
+        *(getattr(models.Movie, name) for name in NUMERIC_COLUMNS),
+        *(getattr(models.Movie, name) for name in TEXT_COLUMNS),
+        models.Movie.embedding,
+    ]
+
+
+def write_catalog_export(
+    conn: Connection,
+    path: Path,
+    since_id: int = 0,
+    batch_size: int = 5000,
+    embedded_only: bool = False,
+) -> Dict[str, object]:
+    """
+    Stream movies with id > since_id into a new export directory at `path`
+    (only those with an embedding if `embedded_only`).
+
+    The count and the rows are read in one REPEATABLE READ snapshot, rows
+    come through a server-side cursor, and the directory is swapped into
+    place only once it is complete. Returns the manifest.
+    """
+    if conn.dialect.name == "postgresql":
+        # SQLite (used by the tests) is serializable already
+        conn = conn.execution_options(isolation_level="REPEATABLE READ")
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    try:
+        with conn.begin():
+            where = models.Movie.id > since_id
+            if embedded_only:
+                where = where & models.Movie.embedding.is_not(None)
+            count = conn.execute(select(func.count(models.Movie.id)).where(where)).scalar_one()
+
+            ids = open_memmap(tmp / "id.npy", mode="w+", dtype=np.int32, shape=(count,))
+            numeric = {
+                name: open_memmap(tmp / f"{name}.npy", mode="w+", dtype=dtype, shape=(count,))
+                for name, dtype in NUMERIC_COLUMNS.items()
+            }
+            embeddings = open_memmap(
+                tmp / "embedding.npy", mode="w+", dtype=np.float32, shape=(count, EMBEDDING_DIM)
+            )
+            text_writers = {name: _TextColumnWriter(tmp, name, count) for name in TEXT_COLUMNS}
+
+            result = conn.execution_options(yield_per=batch_size).execute(
+                select(*_movie_columns()).where(where).order_by(models.Movie.id)
+            )
+
+            i = 0
+            for row in result:
+                if i >= count:
+                    break  # can't happen inside one snapshot, but never overrun the files
+                ids[i] = row.id
+                for name, column in numeric.items():
+                    value = getattr(row, name)
+                    if value is None:
+                        value = np.nan if column.dtype.kind == "f" else NULL_INT
+                    column[i] = value
+                for name, writer in text_writers.items():
+                    writer.append(getattr(row, name))
+                if row.embedding is None:
+                    embeddings[i] = np.nan
+                else:
+                    embeddings[i] = np.asarray(row.embedding, dtype=np.float32)
+                i += 1
+            result.close()
+
+        for writer in text_writers.values():
+            writer.close()
+        for array in (ids, embeddings, *numeric.values()):
+            array.flush()
+
+        manifest = {
+            "format": EXPORT_FORMAT,
+            "count": i,
+            "dim": EMBEDDING_DIM,
+            "since_id": int(since_id),
+            "max_id": int(ids[i - 1]) if i else int(since_id),
+            "created_at": time.time(),
+        }
+        del ids, embeddings, numeric
+        if i != count:
+            raise RuntimeError(f"export expected {count} rows but read {i}")
+
+        (tmp / "manifest.json").write_text(json.dumps(manifest, indent=2))
+        if path.exists():
+            shutil.rmtree(path)
+        os.replace(tmp, path)
+        return manifest
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+class _TextColumnWriter:
+    def __init__(self, directory: Path, name: str, count: int):
+        self.offsets = open_memmap(
+            directory / f"{name}.offsets.npy", mode="w+", dtype=np.int64, shape=(count + 1,)
+        )
+        self.valid = open_memmap(
+            directory / f"{name}.valid.npy", mode="w+", dtype=np.bool_, shape=(count,)
+        )
+        self.offsets[0] = 0
+        self._data = (directory / f"{name}.utf8").open("wb")
+        self._i = 0
+        self._pos = 0
+
+    def append(self, value: Optional[str]) -> None:
+        if value is not None:
+            data = value.encode("utf-8")
+            self._data.write(data)
+            self._pos += len(data)
+        self.valid[self._i] = value is not None
+        self._i += 1
+        self.offsets[self._i] = self._pos
+
+    def close(self) -> None:
+        self._data.close()
+        self.offsets.flush()
+        self.valid.flush()
+
+
+class CatalogExport:
+    """Read-only, memory-mapped view of an export directory."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.manifest = json.loads((self.path / "manifest.json").read_text())
+        if self.manifest.get("format") != EXPORT_FORMAT:
+            raise ValueError(f"unsupported catalog export format in {self.path}")
+        self.ids = self._load("id.npy")
+        self.embeddings = self._load("embedding.npy")
+        self._text: Dict[str, Tuple[np.ndarray, np.ndarray, np.memmap]] = {}
+
+    def __len__(self) -> int:
+        return int(self.manifest["count"])
+
+    @property
+    def since_id(self) -> int:
+        return int(self.manifest["since_id"])
+
+    @property
+    def max_id(self) -> int:
+        return int(self.manifest["max_id"])
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(self.path / name, mmap_mode="r")
+
+    def column(self, name: str) -> np.ndarray:
+        """Numeric column (see NUMERIC_COLUMNS for the NULL encoding)."""
+        if name not in NUMERIC_COLUMNS:
+            raise KeyError(name)
+        return self._load(f"{name}.npy")
+
+    def has_embedding(self) -> np.ndarray:
+        if len(self) == 0:
+            return np.zeros(0, dtype=bool)
+        return ~np.isnan(self.embeddings[:, 0])
+
+    def _text_column(self, name: str):
+        column = self._text.get(name)
+        if column is None:
+            if name not in TEXT_COLUMNS:
+                raise KeyError(name)
+            data_path = self.path / f"{name}.utf8"
+            data = (
+                np.memmap(data_path, dtype=np.uint8, mode="r")
+                if data_path.stat().st_size
+                else np.zeros(0, dtype=np.uint8)
+            )
+            column = (
+                self._load(f"{name}.offsets.npy"),
+                self._load(f"{name}.valid.npy"),
+                data,
+            )
+            self._text[name] = column
+        return column
+
+    def text(self, name: str, i: int) -> Optional[str]:
+        offsets, valid, data = self._text_column(name)
+        if not valid[i]:
+            return None
+        return bytes(data[offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+    def texts(self, name: str, start: int = 0, stop: Optional[int] = None) -> List[Optional[str]]:
+        stop = len(self) if stop is None else min(stop, len(self))
+        return [self.text(name, i) for i in range(start, stop)]
+
+    def iter_rows(self, batch_size: int = 2000) -> Iterator[List[tuple]]:
+        """
+        Batches of plain tuples in the column order
+        (id, startYear, imdb_rating, imdb_votes, title, overview,
+        tmdb_genres, poster_path, embedding), NULLs as None.
+        """
+        numeric = {name: self.column(name) for name in NUMERIC_COLUMNS}
+        has_embedding = self.has_embedding()
+        for start in range(0, len(self), batch_size):
+            stop = min(start + batch_size, len(self))
+            columns = [self.ids[start:stop].tolist()]
+            for name, values in numeric.items():
+                chunk = values[start:stop]
+                if chunk.dtype.kind == "f":
+                    columns.append([None if np.isnan(v) else float(v) for v in chunk])
+                else:
+                    columns.append([None if v == NULL_INT else int(v) for v in chunk])
+            for name in TEXT_COLUMNS:
+                columns.append(self.texts(name, start, stop))
+            columns.append([
+                self.embeddings[j] if has_embedding[j] else None for j in range(start, stop)
+            ])
+            yield list(zip(*columns))
@@ -0,0 +1,187 @@
+"""
+In-process scoring engine for smart-mode recommendations.
+
+Postgres stays the source of truth. The engine snapshots every movie
+embedding into one contiguous float32 matrix, precomputes the row norms,
+takes the stored quality weights (movies.quality_score) and scores a user
+profile with a single matrix-vector product.
+
+Select it per deployment with SMART_ENGINE=numpy (default: postgres).
+The matrix is memory-mapped from the shared embedding store (see
+app/embedding_store.py) unless EMBEDDING_STORE=db.
+"""
+
+import os
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .catalog import CatalogCache, CatalogVersion, scored_catalog_version
+from .catalog_files import CatalogExport
+from .embedding_store import EMBEDDING_STORE, get_embedding_store
+
+SMART_ENGINE = os.getenv("SMART_ENGINE", "postgres").lower()
+
+# Rows whose quality weight is NULL in SQL sort after every scored row.
+UNSCORED_PENALTY = np.float32(1e30)
+
+
+class EmbeddingEngine:
+    def __init__(
+        self,
+        ids: np.ndarray,
+        matrix: np.ndarray,
+        quality: np.ndarray,
+        version: Optional[CatalogVersion] = None,
+    ):
+        if len(ids) > 1 and not bool(np.all(ids[1:] > ids[:-1])):
+            order = np.argsort(ids, kind="stable")
+            ids, matrix, quality = ids[order], matrix[order], np.asarray(quality)[order]
+        self.ids = np.ascontiguousarray(ids, dtype=np.int32)
+        # Already sorted float32 input (e.g. a memory-mapped store) is used as is
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.version = version
+
+        norms = np.linalg.norm(self.matrix, axis=1)
+        norms[norms == 0] = np.inf
+        self.norms = norms.astype(np.float32)
+
+        # score = cosine_distance - quality, so keep the negated weight around
+        offset = -np.asarray(quality, dtype=np.float32)
+        offset[~np.isfinite(offset)] = UNSCORED_PENALTY
+        self.offset = offset
+
+    def __len__(self) -> int:
+        return int(self.ids.shape[0])
+
+    @property
+    def dim(self) -> int:
+        return int(self.matrix.shape[1])
+
+    @classmethod
+    def from_db(cls, db: Session, version: Optional[CatalogVersion] = None) -> Optional["EmbeddingEngine"]:
+        rows = db.execute(
+            select(models.Movie.id, models.Movie.embedding, models.Movie.quality_score)
+            .where(models.Movie.embedding.is_not(None))
+            .order_by(models.Movie.id)
+        ).all()
+        if not rows:
+            return None
+
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int32, count=len(rows))
+        matrix = np.stack([np.asarray(r[1], dtype=np.float32) for r in rows])
+        quality = np.array(
+            [np.nan if r[2] is None else r[2] for r in rows], dtype=np.float32
+        )
+        return cls(ids, matrix, quality, version=version)
+
+    @classmethod
+    def from_export(
+        cls,
+        export: CatalogExport,
+        db: Session,
+        version: Optional[CatalogVersion] = None,
+    ) -> Optional["EmbeddingEngine"]:
+        """
+        Build from a columnar export's embedding matrix instead of reading
+        every vector from Postgres; only the quality weights are queried.
+        """
+        keep = export.has_embedding()
+        if not keep.any():
+            return None
+        if keep.all():
+            ids, matrix = np.asarray(export.ids, dtype=np.int32), export.embeddings
+        else:
+            ids, matrix = np.asarray(export.ids[keep], dtype=np.int32), export.embeddings[keep]
+
+        rows = db.execute(
+            select(models.Movie.id, models.Movie.quality_score)
+            .where(models.Movie.embedding.is_not(None))
+        ).all()
+        quality_by_id = {r[0]: r[1] for r in rows}
+        quality = np.array(
+            [np.nan if quality_by_id.get(i) is None else quality_by_id[i] for i in ids.tolist()],
+            dtype=np.float32,
+        )
+        return cls(ids, matrix, quality, version=version)
+
+    def rows_for(self, movie_ids: Iterable[int]) -> np.ndarray:
+        """Row positions of the given movie ids; ids not in the matrix are dropped."""
+        movie_ids = np.fromiter(movie_ids, dtype=np.int64)
+        if movie_ids.size == 0:
+            return np.empty(0, dtype=np.intp)
+        pos = np.searchsorted(self.ids, movie_ids)
+        pos = np.clip(pos, 0, len(self) - 1)
+        return pos[self.ids[pos] == movie_ids]
+
+    def similarities(self, movie_id: int, candidate_ids: Iterable[int]):
+        """
+        Cosine similarity of `movie_id` to each candidate in the matrix.
+        Returns (candidate ids, similarities); None if movie_id isn't loaded.
+        """
+        target = self.rows_for([movie_id])
+        if target.size == 0:
+            return None
+        t = int(target[0])
+        rows = self.rows_for(candidate_ids)
+        sims = (self.matrix[rows] @ self.matrix[t]) / (self.norms[rows] * self.norms[t])
+        return self.ids[rows], sims
+
+    def score(self, profile: Sequence[float]) -> Optional[np.ndarray]:
+        """Smart-mode score for every movie (lower is better)."""
+        p = np.asarray(profile, dtype=np.float32)
+        p_norm = float(np.linalg.norm(p))
+        if p_norm == 0.0:
+            return None
+
+        sims = self.matrix @ p
+        sims /= self.norms * p_norm
+        return (1.0 - sims) + self.offset
+
+    def top_k(
+        self,
+        profile: Sequence[float],
+        exclude_ids: Iterable[int] = (),
+        k: int = 1,
+    ) -> List[int]:
+        """Best `k` movie ids for a profile, skipping `exclude_ids`."""
+        scores = self.score(profile)
+        if scores is None:
+            return []
+
+        scores[self.rows_for(exclude_ids)] = np.inf
+
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        cand = np.argpartition(scores, k - 1)[:k]
+        cand = cand[np.argsort(scores[cand], kind="stable")]
+        cand = cand[np.isfinite(scores[cand])]
+        return self.ids[cand].tolist()
+
+
+def _build_engine(db: Session, version: CatalogVersion) -> Optional[EmbeddingEngine]:
+    if EMBEDDING_STORE == "mmap":
+        # The store only holds embeddings; a rescore doesn't need a new one,
+        # an in-place embedding update does (embeddings version, version[2])
+        store = get_embedding_store(db, version[:3])
+        if store is not None:
+            return EmbeddingEngine.from_export(store, db, version=version)
+    return EmbeddingEngine.from_db(db, version=version)
+
+
+_ENGINE_CACHE: CatalogCache[EmbeddingEngine] = CatalogCache(
+    _build_engine, read_version=scored_catalog_version,
+)
+
+
+def get_embedding_engine(db: Session) -> Optional[EmbeddingEngine]:
+    """Current engine snapshot, or None while the catalog is empty."""
+    return _ENGINE_CACHE.get(db)
+
+
+def invalidate_embedding_engine() -> None:
+    _ENGINE_CACHE.invalidate()
@@ -0,0 +1,143 @@
+"""
+Read-only, memory-mapped embedding store shared by all API workers.
+
+Every worker process that runs the numpy engine needs the full embedding
+matrix. Instead of each one reading all vectors from Postgres into private
+memory, the matrix is written once to disk as a catalog export (see
+app/catalog_files.py) with only the movies that have an embedding:
+
+    EMBEDDING_STORE_DIR/
+        current.json           {"checksum": ..., "version": [count, max_id, embeddings_version]}
+        <checksum>/            export directory, ids ascending
+
+The directory name is a checksum of the ids and embedding bytes, so
+identical catalogs always map the same files. Whether the store is current
+is decided by the version: embeddings_version is bumped by a trigger on
+every insert, delete or embedding update (app/migrations.py), so vectors
+replaced in place under the same ids also get a rebuild. Workers np.load them with
+mmap_mode="r": starting a worker is an mmap, and N workers share one copy
+in the page cache. Whichever worker first finds the store stale rebuilds it
+under a file lock; the others wait on the lock and map the result.
+
+Disable with EMBEDDING_STORE=db to read the matrix from Postgres per worker.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from .catalog import CatalogVersion
+from .catalog_files import CatalogExport, write_catalog_export
+
+EMBEDDING_STORE = os.getenv("EMBEDDING_STORE", "mmap").lower()
+EMBEDDING_STORE_DIR = Path(
+    os.getenv(
+        "EMBEDDING_STORE_DIR",
+        str(Path(__file__).resolve().parents[1] / "data" / "embedding_store"),
+    )
+)
+
+_CHECKSUM_BLOCK_ROWS = 65536
+
+logger = logging.getLogger(__name__)
+
+
+def export_checksum(export: CatalogExport) -> str:
+    """SHA-256 over the id column and the embedding matrix, in blocks."""
+    digest = hashlib.sha256()
+    digest.update(str(export.embeddings.shape).encode("ascii"))
+    digest.update(export.ids.tobytes())
+    for start in range(0, len(export), _CHECKSUM_BLOCK_ROWS):
+        digest.update(export.embeddings[start:start + _CHECKSUM_BLOCK_ROWS].tobytes())
+    return digest.hexdigest()[:32]
+
+
+def _read_current(root: Path) -> Optional[dict]:
+    try:
+        return json.loads((root / "current.json").read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def open_embedding_store(
+    version: CatalogVersion,
+    root: Path = EMBEDDING_STORE_DIR,
+) -> Optional[CatalogExport]:
+    """Map the store if it was built for this catalog version, else None."""
+    current = _read_current(root)
+    if current is None or tuple(current.get("version", ())) != tuple(version):
+        return None
+    try:
+        return CatalogExport(root / current["checksum"])
+    except (OSError, ValueError, KeyError) as exc:
+        logger.warning("Ignoring unreadable embedding store in %s: %s", root, exc)
+        return None
+
+
+def build_embedding_store(
+    db: Session,
+    version: CatalogVersion,
+    root: Path = EMBEDDING_STORE_DIR,
+) -> CatalogExport:
+    """Export the embedded movies, name the result by checksum and publish it."""
+    root.mkdir(parents=True, exist_ok=True)
+    staging = root / f"build-{os.getpid()}"
+
+    with db.get_bind().connect() as conn:
+        write_catalog_export(conn, staging, embedded_only=True)
+
+    checksum = export_checksum(CatalogExport(staging))
+    target = root / checksum
+    if target.exists():
+        shutil.rmtree(staging)  # same content as an earlier build
+    else:
+        os.replace(staging, target)
+
+    tmp = root / f".current.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps({"checksum": checksum, "version": list(version)}))
+    os.replace(tmp, root / "current.json")
+
+    # Older generations may still be mapped by other workers; unlinking is
+    # safe on POSIX, the pages live until the last mapping goes away.
+    for entry in root.iterdir():
+        if entry.is_dir() and entry.name != checksum and not entry.name.startswith("build-"):
+            shutil.rmtree(entry, ignore_errors=True)
+
+    return CatalogExport(target)
+
+
+def get_embedding_store(
+    db: Session,
+    version: CatalogVersion,
+    root: Path = EMBEDDING_STORE_DIR,
+) -> Optional[CatalogExport]:
+    """Map the current store, building it first (once across processes) if stale."""
+    store = open_embedding_store(version, root)
+    if store is not None:
+        return store
+
+    with _store_lock(root):
+        store = open_embedding_store(version, root)
+        if store is None:
+            logger.info("Building embedding store for catalog %s...", version)
+            store = build_embedding_store(db, version, root)
+    return store
+
+
+@contextmanager
+def _store_lock(root: Path):
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
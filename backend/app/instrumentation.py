@@ -0,0 +1,224 @@
+"""
+Per-request latency and SQL instrumentation.
+
+RequestMetricsMiddleware opens a RequestStats for every HTTP request and
+keeps it in a context variable. Everything that runs on behalf of the
+request adds to it, including sync handlers in the threadpool, since they
+inherit the context:
+
+- SQLAlchemy cursor hooks count queries, database time and rows fetched;
+- TimedQueuePool, the sync engine's pool, records how long each
+  checkout took, whenever the session first needs a connection;
+- span() / @timed() time named sections such as profile lookup or ranking.
+
+When the response starts, the totals are sent back in a Server-Timing
+header (total, db, pool and one entry per span). When it finishes, they
+are recorded as histograms labelled by route template for GET /metrics.
+Streamed bodies are still running when the headers go out, so their
+Server-Timing covers only the work done before the first byte.
+"""
+
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from .metrics import counter, gauge, histogram
+
+REQUEST_SECONDS = histogram(
+    "http_request_duration_seconds", "Request latency", ("method", "route", "status"),
+)
+REQUEST_DB_SECONDS = histogram(
+    "http_request_db_seconds", "Database time per request", ("route",),
+)
+REQUEST_DB_QUERIES = histogram(
+    "http_request_db_queries", "SQL statements per request", ("route",),
+    buckets=(0, 1, 2, 3, 4, 5, 7, 10, 15, 20, 30, 50, 100),
+)
+REQUEST_DB_ROWS = histogram(
+    "http_request_db_rows", "Rows returned or affected by SQL per request", ("route",),
+    buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 100000),
+)
+DB_QUERIES = counter("db_queries_total", "SQL statements executed")
+DB_QUERY_SECONDS = histogram("db_query_seconds", "Time per SQL statement")
+POOL_WAIT_SECONDS = histogram(
+    "db_pool_checkout_wait_seconds", "Time to get a connection from the pool",
+)
+POOL_CHECKED_OUT = gauge("db_pool_checked_out", "Connections currently checked out")
+POOL_SIZE = gauge("db_pool_size", "Configured pool size")
+POOL_OVERFLOW = gauge("db_pool_overflow", "Connections open beyond the pool size")
+SPAN_SECONDS = histogram("span_seconds", "Time in instrumented code sections", ("name",))
+
+
+class RequestStats:
+    __slots__ = ("started", "queries", "db_seconds", "rows", "pool_seconds", "spans")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.pool_seconds = 0.0
+        self.spans: Dict[str, float] = {}
+
+    def add_span(self, name: str, seconds: float) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        total = time.perf_counter() - self.started
+        parts = [
+            f"total;dur={total * 1000:.1f}",
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries, {self.rows} rows"',
+        ]
+        if self.pool_seconds:
+            parts.append(f"pool;dur={self.pool_seconds * 1000:.1f}")
+        for name, seconds in self.spans.items():
+            parts.append(f"{name};dur={seconds * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+@contextmanager
+def collect_stats():
+    """Collect stats for the enclosed block (used outside HTTP requests too)."""
+    stats = RequestStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        SPAN_SECONDS.observe(elapsed, name=name)
+        stats = _current.get()
+        if stats is not None:
+            stats.add_span(name, elapsed)
+
+
+def timed(name: str):
+    """Decorator form of span()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_pool_wait(seconds: float) -> None:
+    POOL_WAIT_SECONDS.observe(seconds)
+    stats = _current.get()
+    if stats is not None:
+        stats.pool_seconds += seconds
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records the wait (or connect) time of every checkout."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            record_pool_wait(time.perf_counter() - start)
+
+
+def update_pool_gauges(engine: Engine) -> None:
+    pool = engine.pool
+    for metric, attr in ((POOL_CHECKED_OUT, "checkedout"), (POOL_SIZE, "size"), (POOL_OVERFLOW, "overflow")):
+        fn = getattr(pool, attr, None)
+        if fn is not None:
+            metric.set(fn())
+
+
+# Registered on the Engine class so the sync and async engines are both covered
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    DB_QUERIES.inc()
+    DB_QUERY_SECONDS.observe(elapsed)
+
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        rowcount = getattr(cursor, "rowcount", -1)
+        if rowcount and rowcount > 0:
+            stats.rows += rowcount
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+class RequestMetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses and contextvars work."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        # Lets in-process callers (tests/test_query_budgets.py) read
+        # the totals once the response, streamed bodies included, is done
+        scope["request_stats"] = stats
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", stats.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            route_label = getattr(route, "path", None) or "unmatched"
+            elapsed = time.perf_counter() - stats.started
+            REQUEST_SECONDS.observe(
+                elapsed, method=scope["method"], route=route_label, status=status_code,
+            )
+            REQUEST_DB_SECONDS.observe(stats.db_seconds, route=route_label)
+            REQUEST_DB_QUERIES.observe(stats.queries, route=route_label)
+            REQUEST_DB_ROWS.observe(stats.rows, route=route_label)
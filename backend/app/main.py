@@ -1,10 +1,25 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text
 
-from .database import Base, engine
+from .database import DB_DRIVER, Base, SessionLocal, engine
+from .instrumentation import RequestMetricsMiddleware, update_pool_gauges
+from .metrics import render_prometheus
+from .migrations import run_migrations
+from .embedding_engine import SMART_ENGINE, get_embedding_engine
+from .random_sampler import RANDOM_ENGINE, get_random_sampler
+from .vector_index import ensure_embedding_index
 from .routers import auth_routes, movie_routes
+import logging
 import os
+
+# uvicorn only configures its own loggers; this shows the app's (app.*)
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(levelname)s:     %(name)s: %(message)s",
+)
+
 app = FastAPI(title="Movie Recommender Playground")
 
 # Frontend runs at http://localhost:8080
@@ -19,7 +34,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
+# Added last so it wraps CORS and times the whole request
+app.add_middleware(RequestMetricsMiddleware)
 
 
 @app.on_event("startup")
@@ -28,7 +46,31 @@ def on_startup():
     with engine.begin() as conn:
         conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        run_migrations(conn)
+
+    # No-op until the catalog is loaded; initialize_db builds it after the load
+    with engine.begin() as conn:
+        ensure_embedding_index(conn)
+
+    # Snapshot the catalog up front so the first request doesn't pay for it
+    with SessionLocal() as db:
+        if SMART_ENGINE == "numpy":
+            get_embedding_engine(db)
+        if RANDOM_ENGINE == "sampler":
+            get_random_sampler(db)
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """Prometheus text exposition of this worker's metrics."""
+    update_pool_gauges(engine)
+    return render_prometheus()
 
 
+# Registered first so its handlers win over the sync ones on the same paths
+if DB_DRIVER == "async":
+    from .routers import async_routes
+    app.include_router(async_routes.router)
 app.include_router(auth_routes.router)
 app.include_router(movie_routes.router)
@@ -0,0 +1,142 @@
+"""
+In-place schema upgrades for databases created by older versions.
+
+Base.metadata.create_all only creates missing tables, so constraints and
+indexes added to existing tables are applied here, idempotently, from the
+API startup hook. Each step checks the catalog first and is a no-op once
+applied.
+"""
+
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from .catalog import EMBEDDINGS_VERSION_KEY
+from .scoring import RANDOM_MIN_VOTES, refresh_movie_scores
+
+logger = logging.getLogger(__name__)
+
+# Serializes migrations between API workers starting at the same time
+_MIGRATION_LOCK_KEY = 7_310_017
+
+
+def _constraint_exists(conn: Connection, name: str) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM pg_constraint WHERE conname = :name"),
+        {"name": name},
+    ).first() is not None
+
+
+def _column_exists(conn: Connection, table: str, column: str) -> bool:
+    return conn.execute(
+        text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = :table AND column_name = :column"
+        ),
+        {"table": table, "column": column},
+    ).first() is not None
+
+
+def dedupe_ratings(conn: Connection) -> int:
+    """
+    Keep only the newest rating per (user, movie) and drop the profiles of
+    the affected users; they are rebuilt from the remaining ratings on
+    first use. Returns the number of deleted rows.
+    """
+    affected = conn.execute(
+        text(
+            """
+            WITH ranked AS (
+                SELECT id, user_id,
+                       row_number() OVER (
+                           PARTITION BY user_id, movie_id
+                           ORDER BY created_at DESC NULLS LAST, id DESC
+                       ) AS rn
+                FROM ratings
+            )
+            DELETE FROM ratings
+            USING ranked
+            WHERE ratings.id = ranked.id AND ranked.rn > 1
+            RETURNING ratings.user_id
+            """
+        )
+    ).scalars().all()
+
+    users = sorted(set(affected))
+    if users:
+        conn.execute(
+            text("DELETE FROM user_profiles WHERE user_id = ANY(:users)"),
+            {"users": users},
+        )
+    return len(affected)
+
+
+def migrate_ratings(conn: Connection) -> None:
+    if not _constraint_exists(conn, "uq_ratings_user_movie"):
+        removed = dedupe_ratings(conn)
+        if removed:
+            logger.info("Removed %d duplicate ratings before adding uq_ratings_user_movie.", removed)
+        conn.execute(text(
+            "ALTER TABLE ratings "
+            "ADD CONSTRAINT uq_ratings_user_movie UNIQUE (user_id, movie_id)"
+        ))
+
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_ratings_user_created "
+        "ON ratings (user_id, created_at, id)"
+    ))
+
+
+def migrate_movie_scores(conn: Connection) -> None:
+    """Add the precomputed score columns and backfill them once."""
+    missing = [
+        column for column in ("quality_score", "sample_weight")
+        if not _column_exists(conn, "movies", column)
+    ]
+    for column in missing:
+        conn.execute(text(f"ALTER TABLE movies ADD COLUMN IF NOT EXISTS {column} double precision"))
+    if missing:
+        updated = refresh_movie_scores(conn)
+        logger.info("Backfilled quality_score and sample_weight for %d movies.", updated)
+
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_movies_random_pool "
+        f"ON movies (id, sample_weight) WHERE imdb_votes > {RANDOM_MIN_VOTES}"
+    ))
+
+
+def migrate_embeddings_version(conn: Connection) -> None:
+    """
+    Bump catalog_meta.embeddings_version from a statement trigger whenever
+    movies are inserted, deleted or get new embeddings, so the embedding
+    store and engines notice an in-place update that keeps every id.
+    """
+    conn.execute(text(
+        f"""
+        CREATE OR REPLACE FUNCTION bump_embeddings_version() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO catalog_meta (key, value) VALUES ('{EMBEDDINGS_VERSION_KEY}', 1)
+            ON CONFLICT (key) DO UPDATE SET value = catalog_meta.value + 1;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    ))
+    exists = conn.execute(
+        text("SELECT 1 FROM pg_trigger WHERE tgname = 'movies_embeddings_version'"),
+    ).first() is not None
+    if not exists:
+        conn.execute(text(
+            "CREATE TRIGGER movies_embeddings_version "
+            "AFTER INSERT OR DELETE OR UPDATE OF embedding ON movies "
+            "FOR EACH STATEMENT EXECUTE FUNCTION bump_embeddings_version()"
+        ))
+
+
+def run_migrations(conn: Connection) -> None:
+    """Apply every pending migration inside the caller's transaction."""
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _MIGRATION_LOCK_KEY})
+    migrate_ratings(conn)
+    migrate_movie_scores(conn)
+    migrate_embeddings_version(conn)
@@ -1,13 +1,16 @@
 from sqlalchemy import (
     Column,
     Integer,
+    BigInteger,
     String,
     DateTime,
     Boolean,
     ForeignKey,
     func,
     Float,
-    UniqueConstraint
+    Index,
+    UniqueConstraint,
+    text,
 )
 from sqlalchemy.orm import relationship
 from pgvector.sqlalchemy import Vector
@@ -26,6 +29,7 @@ class User(Base):
 
     ratings = relationship("Rating", back_populates="user", cascade="all, delete-orphan")
     favorites = relationship("Favorite", back_populates="user", cascade="all, delete-orphan")
+    profile = relationship("UserProfile", back_populates="user", uselist=False, cascade="all, delete-orphan")
 
 
 class Movie(Base):
@@ -44,9 +48,25 @@ class Movie(Base):
 
     embedding = Column(Vector(128))  # pgvector 128 dims
 
+    # Precomputed by scoring.refresh_movie_scores; NULL when an input is NULL
+    quality_score = Column(Float)  # smart mode bonus
+    sample_weight = Column(Float)  # random mode weight
+
     ratings = relationship("Rating", back_populates="movie", cascade="all, delete-orphan")
     favorites = relationship("Favorite", back_populates="movie", cascade="all, delete-orphan")
 
+    # Existing databases get these from app/migrations.py
+    __table_args__ = (
+        # Random mode's candidate pool (scoring.RANDOM_MIN_VOTES), read with
+        # index-only scans instead of the wide movie rows
+        Index(
+            "ix_movies_random_pool",
+            "id",
+            "sample_weight",
+            postgresql_where=text("imdb_votes > 1000"),
+        ),
+    )
+
 
 class Rating(Base):
     __tablename__ = "ratings"
@@ -60,6 +80,13 @@ class Rating(Base):
     user = relationship("User", back_populates="ratings")
     movie = relationship("Movie", back_populates="ratings")
 
+    # Existing databases get these from app/migrations.py
+    __table_args__ = (
+        UniqueConstraint("user_id", "movie_id", name="uq_ratings_user_movie"),
+        # Serves the per-user newest-first scans (history, profile window)
+        Index("ix_ratings_user_created", "user_id", "created_at", "id"),
+    )
+
 class Favorite(Base):
     __tablename__ = "favorites"
 
@@ -74,3 +101,33 @@ class Favorite(Base):
     __table_args__ = (
         UniqueConstraint("user_id", "movie_id", name="uq_favorites_user_movie"),
     )
+
+
+class UserProfile(Base):
+    """
+    Running taste vector of a user: the weighted sum of the embeddings of their
+    last LAST_RATINGS_N ratings (+1 / -1) and all favorites (+1), plus the sum
+    of absolute weights. Kept up to date by app/profiles.py.
+    """
+    __tablename__ = "user_profiles"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    vector_sum = Column(Vector(128), nullable=False)
+    weight_total = Column(Float, nullable=False, default=0.0)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    user = relationship("User", back_populates="profile")
+
+
+class CatalogMeta(Base):
+    """
+    Small counters about the catalog, keyed by name. `scores_version` is
+    bumped by app/scoring.py whenever stored movie scores change, and
+    `embeddings_version` by a trigger on movies (app/migrations.py), so the
+    in-memory snapshots (app/catalog.py) notice a reweight or new vectors.
+    """
+    __tablename__ = "catalog_meta"
+
+    key = Column(String(64), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,326 @@
+"""
+2D UMAP projection of the catalog used by /movies/space.
+
+Fitting UMAP takes tens of seconds, so the projection is fitted offline by
+app/scripts/build_movie_space.py and stored as a versioned artifact:
+
+    MOVIE_SPACE_PATH (default: <app root>/data/movie_space.pkl)
+
+The artifact holds the movie ids, titles, vote counts, 2D coordinates and
+the fitted reducer (used to project user profiles), tagged with the catalog
+version it was fitted on. The API loads it lazily and checks staleness with
+catalog_version() instead of re-reading every embedding; rebuilds happen in
+the background (see MovieSpaceCache), never on the request path.
+"""
+
+import base64
+import fcntl
+import logging
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .catalog import CatalogVersion, catalog_version
+from .database import SessionLocal
+from .spatial import SpatialGrid
+
+MOVIE_SPACE_PATH = Path(
+    os.getenv(
+        "MOVIE_SPACE_PATH",
+        str(Path(__file__).resolve().parents[1] / "data" / "movie_space.pkl"),
+    )
+)
+ARTIFACT_FORMAT = 1
+MOVIE_SPACE_MAX_STALENESS_SECONDS = float(os.getenv("MOVIE_SPACE_MAX_STALENESS_SECONDS", "60"))
+
+UMAP_PARAMS = {
+    "n_components": 2,
+    "n_neighbors": 400,
+    "min_dist": 0.1,
+    "metric": "cosine",
+    "random_state": 42,
+}
+
+logger = logging.getLogger(__name__)
+
+
+class MovieSpace:
+    def __init__(
+        self,
+        version: CatalogVersion,
+        ids: np.ndarray,
+        titles: List[str],
+        votes: np.ndarray,
+        coords: np.ndarray,
+        reducer,
+        created_at: Optional[float] = None,
+    ):
+        self.version = tuple(version)
+        self.ids = np.asarray(ids, dtype=np.int32)
+        self.titles = list(titles)
+        self.votes = np.asarray(votes, dtype=np.int64)
+        self.coords = np.asarray(coords, dtype=np.float32)
+        self.reducer = reducer
+        self.created_at = created_at or time.time()
+        self.generation = 0  # assigned when a cache installs it
+
+    def __len__(self) -> int:
+        return int(self.ids.shape[0])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_static_payload", None)
+        state.pop("_static_columns", None)
+        state.pop("_grid", None)
+        return state
+
+    def project(self, vector: List[float]) -> np.ndarray:
+        """2D position of an arbitrary embedding (e.g. a user profile)."""
+        return self.reducer.transform([np.asarray(vector, dtype=float)])[0]
+
+    def grid(self) -> SpatialGrid:
+        """Spatial index over the coordinates, popularity = IMDB votes."""
+        grid = getattr(self, "_grid", None)
+        if grid is None:
+            grid = SpatialGrid(self.coords, self.votes)
+            self._grid = grid
+        return grid
+
+    @property
+    def etag(self) -> str:
+        """Identifies the static part across processes serving the same artifact."""
+        count, max_id = self.version
+        return f'"space-{count}-{max_id}-{int(self.created_at)}"'
+
+    def static_payload(self) -> bytes:
+        """
+        Binary static part, all little-endian, arrays 4-byte aligned:
+
+            b"MSP1" | uint32 n | int32 ids[n] | float32 x[n] | float32 y[n]
+            | uint32 m | m bytes of UTF-8 titles joined by "\n"
+        """
+        payload = getattr(self, "_static_payload", None)
+        if payload is None:
+            n = len(self)
+            titles = "\n".join(t.replace("\n", " ") for t in self.titles).encode("utf-8")
+            payload = b"".join([
+                b"MSP1",
+                np.uint32(n).astype("<u4").tobytes(),
+                self.ids.astype("<i4").tobytes(),
+                self.coords[:, 0].astype("<f4").tobytes(),
+                self.coords[:, 1].astype("<f4").tobytes(),
+                np.uint32(len(titles)).astype("<u4").tobytes(),
+                titles,
+            ])
+            self._static_payload = payload
+        return payload
+
+    def static_columns(self) -> Dict[str, object]:
+        """Static part as JSON-friendly columns (typed arrays in base64)."""
+        columns = getattr(self, "_static_columns", None)
+        if columns is None:
+            columns = {
+                "count": len(self),
+                "ids": pack_array(self.ids, "<i4"),
+                "x": pack_array(self.coords[:, 0], "<f4"),
+                "y": pack_array(self.coords[:, 1], "<f4"),
+                "titles": self.titles,
+            }
+            self._static_columns = columns
+        return columns
+
+    def rating_flags(self, ratings: Iterable[Tuple[int, bool]]) -> np.ndarray:
+        """int8 per point in static order: 1 liked, 0 disliked, -1 unseen."""
+        flags = np.full(len(self), -1, dtype=np.int8)
+        ratings = list(ratings)
+        if not ratings or len(self) == 0:
+            return flags
+        movie_ids = np.array([r[0] for r in ratings], dtype=np.int64)
+        values = np.array([1 if r[1] else 0 for r in ratings], dtype=np.int8)
+        pos = np.clip(np.searchsorted(self.ids, movie_ids), 0, len(self) - 1)
+        found = self.ids[pos] == movie_ids
+        flags[pos[found]] = values[found]
+        return flags
+
+
+def pack_array(values, dtype: str) -> str:
+    """Base64 of a packed little-endian typed array."""
+    return base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode("ascii")
+
+
+def fit_movie_space(db: Session, version: CatalogVersion) -> Optional[MovieSpace]:
+    rows = db.execute(
+        select(
+            models.Movie.id,
+            models.Movie.title,
+            models.Movie.imdb_votes,
+            models.Movie.embedding,
+        )
+        .where(models.Movie.embedding.is_not(None))
+        .order_by(models.Movie.id)
+    ).all()
+    if not rows:
+        return None
+
+    X = np.stack([np.asarray(r.embedding, dtype=float) for r in rows])
+
+    import umap
+    reducer = umap.UMAP(**UMAP_PARAMS)
+    coords = reducer.fit_transform(X)
+
+    return MovieSpace(
+        version=version,
+        ids=np.array([r.id for r in rows]),
+        titles=[r.title for r in rows],
+        votes=np.array([r.imdb_votes or 0 for r in rows]),
+        coords=coords,
+        reducer=reducer,
+    )
+
+
+def save_movie_space(space: MovieSpace, path: Path = MOVIE_SPACE_PATH) -> None:
+    """Write atomically so concurrent readers never see a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with tmp.open("wb") as f:
+        pickle.dump(
+            {"format": ARTIFACT_FORMAT, "umap_params": UMAP_PARAMS, "space": space},
+            f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(tmp, path)
+
+
+def load_movie_space(path: Path = MOVIE_SPACE_PATH) -> Optional[MovieSpace]:
+    if not path.exists():
+        return None
+    try:
+        with path.open("rb") as f:
+            payload = pickle.load(f)
+    except Exception as exc:
+        logger.warning("Ignoring unreadable movie space artifact %s: %s", path, exc)
+        return None
+    if payload.get("format") != ARTIFACT_FORMAT or payload.get("umap_params") != UMAP_PARAMS:
+        return None
+    return payload["space"]
+
+
+class MovieSpaceCache:
+    """
+    Process-wide holder of the current MovieSpace generation.
+
+    - The catalog version is re-checked at most every
+      MOVIE_SPACE_MAX_STALENESS_SECONDS; in between, requests get the current
+      generation without touching the database.
+    - A stale or missing projection is rebuilt on a single background worker.
+      Concurrent requests never start their own fit: they keep getting the
+      previous generation, and only a cold process (no generation at all)
+      answers "building".
+    - A stale generation is only rebuilt once the catalog version has been
+      stable for one check, so a catalog load in progress doesn't trigger a
+      fit per batch.
+    - Fits are also serialized across worker processes with a file lock next
+      to the artifact; whoever waits on it picks up the fresh artifact.
+    """
+
+    def __init__(self, check_seconds: float = MOVIE_SPACE_MAX_STALENESS_SECONDS):
+        self.check_seconds = check_seconds
+        self.generation = 0
+        self._space: Optional[MovieSpace] = None
+        self._checked_at = float("-inf")
+        self._last_version: Optional[CatalogVersion] = None
+        self._check_lock = threading.Lock()
+        self._building: Optional[Future] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="movie-space")
+
+    @property
+    def building(self) -> bool:
+        return self._building is not None
+
+    def get(self, db: Session) -> Optional[MovieSpace]:
+        if time.monotonic() - self._checked_at < self.check_seconds:
+            return self._space
+
+        # Cold requests wait for the first check (it may load the artifact);
+        # warm ones keep serving the current generation.
+        if not self._check_lock.acquire(blocking=self._space is None):
+            return self._space
+        try:
+            if time.monotonic() - self._checked_at >= self.check_seconds:
+                self._observe(catalog_version(db))
+                self._checked_at = time.monotonic()
+            return self._space
+        finally:
+            self._check_lock.release()
+
+    def _observe(self, version: CatalogVersion) -> None:
+        if self._space is None and self._building is None:
+            space = load_movie_space()
+            if space is not None:
+                self._install(space)  # even a stale generation beats nothing
+
+        current = self._space
+        if current is not None and current.version == version:
+            self._last_version = version
+            return
+
+        if self._building is None and version[0] and (
+            current is None or version == self._last_version
+        ):
+            self._building = self._executor.submit(self._rebuild)
+            self._building.add_done_callback(self._build_done)
+        self._last_version = version
+
+    def _install(self, space: MovieSpace) -> None:
+        self.generation += 1
+        space.generation = self.generation
+        self._space = space
+
+    def _rebuild(self) -> None:
+        with _artifact_lock():
+            with SessionLocal() as db:
+                version = catalog_version(db)
+                space = load_movie_space()
+                if space is None or space.version != version:
+                    logger.info("Fitting movie space for catalog %s...", version)
+                    space = fit_movie_space(db, version)
+                    if space is None:
+                        return
+                    save_movie_space(space)
+        self._install(space)
+
+    def _build_done(self, future: Future) -> None:
+        self._building = None
+        exc = future.exception()
+        if exc is not None:
+            logger.error("Movie space rebuild failed: %r", exc)
+        # Re-check on the next request in case the catalog moved meanwhile
+        self._checked_at = float("-inf")
+
+
+@contextmanager
+def _artifact_lock(path: Path = MOVIE_SPACE_PATH):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+movie_space_cache = MovieSpaceCache()
+
+
+def get_movie_space(db: Session) -> Optional[MovieSpace]:
+    return movie_space_cache.get(db)
@@ -0,0 +1,228 @@
+"""
+Persisted user taste vectors.
+
+A profile is the weighted average of the embeddings of a user's last
+LAST_RATINGS_N ratings (👍 = +1, 👎 = -1) and all of their favorites (+1).
+Instead of recomputing it on every request, user_profiles keeps the running
+weighted sum and the total absolute weight, and the write paths apply O(dim)
+deltas:
+
+- a new rating adds its embedding and subtracts the one that ages out of the
+  window,
+- a flipped rating inside the window moves by 2 * embedding,
+- a favorite toggle adds or removes its embedding.
+
+Reading a profile is one primary-key lookup. Profiles that don't exist yet
+(users from before this table) are rebuilt from their ratings on first use.
+"""
+
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from . import models
+
+LAST_RATINGS_N = int(os.getenv("LAST_RATINGS_N", "10"))
+EMBEDDING_DIM = models.UserProfile.vector_sum.type.dim
+
+
+def _weight(rating: bool) -> float:
+    return 1.0 if rating else -1.0
+
+
+def _as_array(emb) -> Optional[np.ndarray]:
+    if emb is None:
+        return None
+    return np.asarray(emb, dtype=np.float64)
+
+
+def _movie_embedding(db: Session, movie_id: int) -> Optional[np.ndarray]:
+    return _as_array(
+        db.execute(
+            select(models.Movie.embedding).where(models.Movie.id == movie_id)
+        ).scalar()
+    )
+
+
+def _window_order():
+    return models.Rating.created_at.desc(), models.Rating.id.desc()
+
+
+def _lock_profile(db: Session, user_id: int) -> Optional[models.UserProfile]:
+    return db.execute(
+        select(models.UserProfile)
+        .where(models.UserProfile.user_id == user_id)
+        .with_for_update()
+    ).scalar_one_or_none()
+
+
+def _store(db: Session, profile: models.UserProfile, agg: np.ndarray, total: float) -> None:
+    if total <= 0:
+        agg = np.zeros_like(agg)  # drop accumulated rounding error
+    profile.vector_sum = agg.astype(np.float32).tolist()
+    profile.weight_total = max(float(total), 0.0)
+    profile.version = (profile.version or 0) + 1
+
+
+def rebuild_user_profile(db: Session, user_id: int) -> models.UserProfile:
+    """Recompute a profile from scratch and upsert it (flushed, not committed)."""
+    agg = np.zeros(EMBEDDING_DIM, dtype=np.float64)
+    total = 0.0
+
+    recent = db.execute(
+        select(models.Rating.rating, models.Movie.embedding)
+        .join(models.Movie, models.Movie.id == models.Rating.movie_id)
+        .where(models.Rating.user_id == user_id)
+        .order_by(*_window_order())
+        .limit(LAST_RATINGS_N)
+    ).all()
+    for rating, emb in recent:
+        if emb is None:
+            continue
+        w = _weight(rating)
+        agg += w * _as_array(emb)
+        total += abs(w)
+
+    favorites = db.execute(
+        select(models.Movie.embedding)
+        .join(models.Favorite, models.Favorite.movie_id == models.Movie.id)
+        .where(models.Favorite.user_id == user_id)
+    ).scalars()
+    for emb in favorites:
+        if emb is None:
+            continue
+        agg += _as_array(emb)
+        total += 1.0
+
+    stmt = insert(models.UserProfile).values(
+        user_id=user_id,
+        vector_sum=agg.astype(np.float32).tolist(),
+        weight_total=total,
+        version=1,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.UserProfile.user_id],
+        set_={
+            "vector_sum": stmt.excluded.vector_sum,
+            "weight_total": stmt.excluded.weight_total,
+            "version": models.UserProfile.version + 1,
+            "updated_at": func.now(),
+        },
+    )
+    db.execute(stmt)
+    db.flush()
+    return db.execute(
+        select(models.UserProfile)
+        .where(models.UserProfile.user_id == user_id)
+        .execution_options(populate_existing=True)
+    ).scalar_one()
+
+
+def get_user_profile(db: Session, user_id: int) -> models.UserProfile:
+    profile = db.get(models.UserProfile, user_id)
+    if profile is None:
+        profile = rebuild_user_profile(db, user_id)
+        db.commit()  # persist the backfill
+    return profile
+
+
+def profile_vector(profile: Optional[models.UserProfile]) -> Optional[List[float]]:
+    if profile is None or not profile.weight_total:
+        return None
+    return (np.asarray(profile.vector_sum, dtype=np.float64) / profile.weight_total).tolist()
+
+
+def get_user_profile_vector(db: Session, user_id: int) -> Optional[List[float]]:
+    return profile_vector(get_user_profile(db, user_id))
+
+
+_LOAD = object()
+
+
+def apply_rating_change(
+    db: Session,
+    user_id: int,
+    movie_id: int,
+    previous: Optional[bool],
+    current: bool,
+    embedding=_LOAD,
+    rating_key: Optional[Tuple[datetime, int]] = None,
+) -> None:
+    """
+    Update the profile after a rating was written and flushed.
+    `previous` is the rating before this write, None if the row is new.
+    Callers that already have the movie's embedding and the rating's
+    (created_at, id) can pass them to skip the lookups.
+    """
+    if previous is not None and previous == current:
+        return
+
+    profile = _lock_profile(db, user_id)
+    if profile is None:
+        rebuild_user_profile(db, user_id)
+        return
+
+    agg = np.asarray(profile.vector_sum, dtype=np.float64)
+    total = profile.weight_total
+    emb = _movie_embedding(db, movie_id) if embedding is _LOAD else _as_array(embedding)
+
+    if previous is None:
+        # New rating enters the window at the top...
+        if emb is not None:
+            agg = agg + _weight(current) * emb
+            total += 1.0
+
+        # ...and pushes the oldest one out.
+        aged = db.execute(
+            select(models.Rating.rating, models.Movie.embedding)
+            .join(models.Movie, models.Movie.id == models.Rating.movie_id)
+            .where(models.Rating.user_id == user_id)
+            .order_by(*_window_order())
+            .offset(LAST_RATINGS_N)
+            .limit(1)
+        ).first()
+        if aged is not None and aged.embedding is not None:
+            agg = agg - _weight(aged.rating) * _as_array(aged.embedding)
+            total -= 1.0
+    else:
+        if emb is None:
+            return
+        if rating_key is None:
+            rating_key = tuple(db.execute(
+                select(models.Rating.created_at, models.Rating.id).where(
+                    models.Rating.user_id == user_id,
+                    models.Rating.movie_id == movie_id,
+                )
+            ).one())
+        newer = db.execute(
+            select(func.count(models.Rating.id)).where(
+                models.Rating.user_id == user_id,
+                tuple_(models.Rating.created_at, models.Rating.id) > tuple_(*rating_key),
+            )
+        ).scalar()
+        if newer >= LAST_RATINGS_N:
+            return  # flipped outside the window, profile unchanged
+        agg = agg + (_weight(current) - _weight(previous)) * emb
+
+    _store(db, profile, agg, total)
+
+
+def apply_favorite_change(db: Session, user_id: int, movie_id: int, added: bool) -> None:
+    """Update the profile after a favorite was added or removed (flushed)."""
+    profile = _lock_profile(db, user_id)
+    if profile is None:
+        rebuild_user_profile(db, user_id)
+        return
+
+    emb = _movie_embedding(db, movie_id)
+    if emb is None:
+        return
+
+    sign = 1.0 if added else -1.0
+    agg = np.asarray(profile.vector_sum, dtype=np.float64) + sign * emb
+    _store(db, profile, agg, profile.weight_total + sign)
@@ -0,0 +1,199 @@
+"""
+Precomputed weighted sampler for random mode.
+
+The random-mode weights (popularity x recency, stored in
+movies.sample_weight) only depend on the catalog, so instead of evaluating
+`-ln(random()) / weight` over every eligible movie per request, an alias
+table (Vose) is built once over the eligible catalog and each draw is O(1).
+Draws are rejected against the user's seen set; when the user's seen movies
+carry most of the pool's weight, or rejection keeps failing, the sampler
+switches to one exact weighted pass over the unseen movies.
+
+Select it per deployment with RANDOM_ENGINE=sampler (default) or postgres.
+"""
+
+import os
+from typing import Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .catalog import CatalogCache, CatalogVersion, scored_catalog_version
+from .scoring import RANDOM_MIN_VOTES
+from .seen import SeenSet
+
+RANDOM_ENGINE = os.getenv("RANDOM_ENGINE", "sampler").lower()
+
+# Once the user's seen movies hold this fraction of the pool's sampling
+# weight, rejection would mostly hit them, so draw exactly instead
+SAMPLER_MAX_SEEN_FRACTION = float(os.getenv("SAMPLER_MAX_SEEN_FRACTION", "0.5"))
+SAMPLER_MAX_DRAWS = int(os.getenv("SAMPLER_MAX_DRAWS", "32"))
+
+
+class AliasSampler:
+    def __init__(
+        self,
+        ids: np.ndarray,
+        weights: np.ndarray,
+        version: Optional[CatalogVersion] = None,
+        seed: Optional[int] = None,
+    ):
+        weights = np.asarray(weights, dtype=np.float64)
+        keep = np.isfinite(weights) & (weights > 0)
+        order = np.argsort(ids[keep], kind="stable")
+
+        self.ids = np.ascontiguousarray(ids[keep][order], dtype=np.int32)
+        self.weights = weights[keep][order]
+        self.total = float(self.weights.sum())
+        self.version = version
+        self._rng = np.random.default_rng(seed)
+        self.prob, self.alias = self._build_alias(self.weights)
+
+    def __len__(self) -> int:
+        return int(self.ids.shape[0])
+
+    @staticmethod
+    def _build_alias(weights: np.ndarray):
+        """
+        Vose's alias table, built in rounds of array operations instead of
+        one Python step per column. Each round hands every small column to
+        the large column whose cumulative surplus covers the start of its
+        deficit; large columns pushed below 1 are the next round's small
+        ones. Every round resolves all small columns and turns some large
+        ones small, so it ends after a few rounds on real weights.
+        """
+        n = len(weights)
+        prob = np.ones(n, dtype=np.float64)
+        alias = np.arange(n, dtype=np.int64)
+        if n == 0:
+            return prob, alias
+
+        scaled = weights * (n / weights.sum())
+        small = np.flatnonzero(scaled < 1.0)
+        large = np.flatnonzero(scaled >= 1.0)
+
+        while small.size and large.size:
+            deficit = 1.0 - scaled[small]
+            starts = np.cumsum(deficit) - deficit
+            donor = np.searchsorted(np.cumsum(scaled[large] - 1.0), starts, side="right")
+            donor = np.minimum(donor, large.size - 1)  # rounding at the far end
+
+            prob[small] = np.clip(scaled[small], 0.0, 1.0)
+            alias[small] = large[donor]
+            scaled[large] -= np.bincount(donor, weights=deficit, minlength=large.size)
+
+            drained = scaled[large] < 1.0
+            small, large = large[drained], large[~drained]
+
+        # Columns left over are 1.0 up to rounding and keep prob 1
+        prob[small] = 1.0
+        alias[small] = small
+        return prob, alias
+
+    @classmethod
+    def from_db(cls, db: Session, version: Optional[CatalogVersion] = None) -> Optional["AliasSampler"]:
+        rows = db.execute(
+            select(models.Movie.id, models.Movie.sample_weight)
+            .where(models.Movie.imdb_votes > RANDOM_MIN_VOTES)
+        ).all()
+        if not rows:
+            return None
+
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int32, count=len(rows))
+        weights = np.array(
+            [np.nan if r[1] is None else r[1] for r in rows], dtype=np.float64
+        )
+        return cls(ids, weights, version=version)
+
+    def rows_for(self, movie_ids: Iterable[int]) -> np.ndarray:
+        if isinstance(movie_ids, np.ndarray):
+            movie_ids = movie_ids.astype(np.int64, copy=False)  # e.g. SeenSet.ids, no Python loop
+        else:
+            movie_ids = np.fromiter(movie_ids, dtype=np.int64)
+        if movie_ids.size == 0 or len(self) == 0:
+            return np.empty(0, dtype=np.intp)
+        pos = np.searchsorted(self.ids, movie_ids)
+        pos = np.clip(pos, 0, len(self) - 1)
+        rows = pos[self.ids[pos] == movie_ids]
+        # Sorted distinct ids (a SeenSet) give sorted distinct rows already
+        if rows.size > 1 and not bool(np.all(rows[1:] > rows[:-1])):
+            rows = np.unique(rows)
+        return rows
+
+    def draw(self) -> int:
+        """One weighted row index, O(1)."""
+        i = int(self._rng.integers(len(self)))
+        return i if self._rng.random() < self.prob[i] else int(self.alias[i])
+
+    def sample_unseen(self, seen: SeenSet) -> Optional[int]:
+        """Weighted random movie id not in `seen`, None if all are seen."""
+        picked = self.sample_unseen_many(seen, 1)
+        return picked[0] if picked else None
+
+    def sample_unseen_many(self, seen: SeenSet, k: int) -> List[int]:
+        """
+        Up to k distinct weighted random movie ids not in `seen`.
+
+        While the seen movies hold less than SAMPLER_MAX_SEEN_FRACTION of
+        the pool's weight, alias draws are rejected against the seen set and
+        the picks so far. Whatever that doesn't fill comes from one exact
+        pass over the unseen movies.
+        """
+        if len(self) == 0 or k <= 0:
+            return []
+
+        seen_rows = self.rows_for(seen.ids)
+        seen_weight = float(self.weights[seen_rows].sum()) / self.total if self.total > 0 else 1.0
+
+        picked: List[int] = []
+        if seen_weight < SAMPLER_MAX_SEEN_FRACTION:
+            taken = set()
+            for _ in range(SAMPLER_MAX_DRAWS * k):
+                row = self.draw()
+                movie_id = int(self.ids[row])
+                if row in taken or movie_id in seen:
+                    continue
+                taken.add(row)
+                picked.append(movie_id)
+                if len(picked) == k:
+                    return picked
+            if taken:
+                seen_rows = np.concatenate([seen_rows, np.fromiter(taken, dtype=np.intp)])
+
+        return picked + self._sample_exact(seen_rows, k - len(picked))
+
+    def _sample_exact(self, seen_rows: np.ndarray, k: int) -> List[int]:
+        """
+        k weighted draws without replacement from the rows outside
+        `seen_rows`, in one pass: Efraimidis-Spirakis keys -ln(u) / w,
+        smallest first.
+        """
+        keys = -np.log(self._rng.random(len(self))) / self.weights
+        keys[seen_rows] = np.inf
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        top = np.argpartition(keys, k - 1)[:k]
+        top = top[np.argsort(keys[top], kind="stable")]
+        top = top[np.isfinite(keys[top])]
+        return self.ids[top].tolist()
+
+
+def _build_sampler(db: Session, version: CatalogVersion) -> Optional[AliasSampler]:
+    return AliasSampler.from_db(db, version=version)
+
+
+_SAMPLER_CACHE: CatalogCache[AliasSampler] = CatalogCache(
+    _build_sampler, read_version=scored_catalog_version,
+)
+
+
+def get_random_sampler(db: Session) -> Optional[AliasSampler]:
+    """Current sampler, or None while no movie is eligible."""
+    return _SAMPLER_CACHE.get(db)
+
+
+def invalidate_random_sampler() -> None:
+    _SAMPLER_CACHE.invalidate()
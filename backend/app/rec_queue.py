@@ -0,0 +1,81 @@
+"""
+Per-user queues of precomputed recommendations.
+
+Scoring the catalog yields the top REC_QUEUE_BATCH movies about as cheaply
+as the top one, so the "next movie" routes compute a batch, serve the head
+of it and keep the rest here. Later requests are answered from the queue
+without a scoring query until it runs low or stops matching its key:
+
+- the key is the mode plus, for smart mode, the user's profile version, so
+  any rating or favorite that moves the profile makes the smart queue stale
+  (also across worker processes, since the version lives in Postgres);
+- movies the user has rated since are skipped against their seen set;
+- entries expire after REC_QUEUE_TTL_SECONDS and are LRU-evicted beyond
+  REC_QUEUE_USERS users.
+
+Reading the queue does not consume it: a movie stays at the head until the
+user rates it.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Sequence
+
+from .seen import SeenSet
+
+REC_QUEUE_BATCH = int(os.getenv("REC_QUEUE_BATCH", "20"))
+REC_QUEUE_TTL_SECONDS = float(os.getenv("REC_QUEUE_TTL_SECONDS", "120"))
+REC_QUEUE_USERS = int(os.getenv("REC_QUEUE_USERS", "10000"))
+
+
+class RecommendationQueue:
+    def __init__(
+        self,
+        max_users: int = REC_QUEUE_USERS,
+        ttl: float = REC_QUEUE_TTL_SECONDS,
+    ):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # user_id -> (key, ids, created_at)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+
+    def peek(self, user_id: int, key: Hashable, seen: SeenSet, count: int) -> Optional[List[int]]:
+        """
+        The first `count` unseen queued ids, or None if there is no usable
+        queue (missing, expired, other key, or fewer than `count` left).
+        Seen ids at the head are dropped as a side effect.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            entry_key, ids, created_at = entry
+            if entry_key != key or time.monotonic() - created_at >= self.ttl:
+                del self._entries[user_id]
+                return None
+
+            unseen = [movie_id for movie_id in ids if movie_id not in seen]
+            self._entries[user_id] = (entry_key, unseen, created_at)
+            self._entries.move_to_end(user_id)
+            if len(unseen) < count:
+                return None
+            return unseen[:count]
+
+    def put(self, user_id: int, key: Hashable, ids: Sequence[int]) -> None:
+        if self.max_users <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (key, list(ids), time.monotonic())
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+rec_queue = RecommendationQueue()
@@ -0,0 +1,87 @@
+"""
+Async handlers for the hottest routes, used when DB_DRIVER=async.
+
+They run on the event loop with an asyncpg-backed AsyncSession, so a
+request waiting on Postgres holds no threadpool thread. The query logic is
+shared with the sync routes: AsyncSession.run_sync hands the helpers a
+regular Session whose I/O is awaited underneath. Those helpers run on the
+event loop thread, so the catalog caches never block there (see
+app/catalog.py) and the NumPy ranking steps go through
+database.run_cpu_bound to a worker thread.
+
+main.py includes this router ahead of the sync ones, so these handlers
+take the same paths. It is only imported in that mode, so the sync
+deployment needs neither asyncpg nor greenlet.
+"""
+
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import auth, models, schemas
+from ..database import get_async_db
+from ..rec_queue import REC_QUEUE_BATCH
+from .movie_routes import rate_and_recommend, recommend_movies, record_rating, recommend_next
+
+router = APIRouter(tags=["async"])
+
+
+async def get_current_user_async(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+) -> models.User:
+    user_id = auth.get_token_user_id(request)
+
+    user = auth.user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    user = await db.get(models.User, user_id)
+    if not user:
+        raise auth.user_not_found()
+    db.expunge(user)
+    auth.user_cache.put(user)
+    return user
+
+
+@router.get("/movies/random", response_model=schemas.MovieOut)
+async def next_movie(
+    mode: str = Query("random", pattern="^(random|smart)$"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
+):
+    return await db.run_sync(recommend_next, current_user.id, mode)
+
+
+@router.post("/movies/rate", response_model=schemas.RatingOut)
+async def rate_movie(
+    rating_in: schemas.RatingCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
+):
+    return await db.run_sync(record_rating, current_user.id, rating_in)
+
+
+@router.post("/movies/rate-next", response_model=schemas.RateNextOut)
+async def rate_and_next(
+    rating_in: schemas.RatingCreate,
+    mode: str = Query("random", pattern="^(random|smart)$"),
+    count: int = Query(1, ge=1, le=REC_QUEUE_BATCH),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
+):
+    return await db.run_sync(rate_and_recommend, current_user.id, rating_in, mode, count)
+
+
+@router.get("/movies/next", response_model=list[schemas.MovieOut])
+async def next_movies(
+    mode: str = Query("random", pattern="^(random|smart)$"),
+    count: int = Query(1, ge=1, le=REC_QUEUE_BATCH),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
+):
+    return await db.run_sync(recommend_movies, current_user.id, mode, count)
+
+
+@router.get("/auth/me", response_model=schemas.UserOut)
+async def get_me(current_user: models.User = Depends(get_current_user_async)):
+    return current_user
@@ -1,4 +1,7 @@
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 
@@ -7,13 +10,14 @@ from ..database import get_db
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+# register and login are async so that, while bcrypt runs on its own
+# executor (auth.password_hasher), they don't hold a threadpool thread.
+# Their database work still goes through the threadpool, and the helpers
+# that run before the hash end their transaction so the pooled connection
+# isn't held while a request waits on bcrypt.
 
-@router.post("/register", response_model=schemas.UserOut)
-def register_user(
-    user_in: schemas.UserCreate,
-    response: Response,
-    db: Session = Depends(get_db),
-):
+
+def _check_available(db: Session, user_in: schemas.UserCreate) -> None:
     existing_username = (
         db.query(models.User).filter(models.User.username == user_in.username).first()
     )
@@ -25,15 +29,50 @@ def register_user(
     )
     if existing_email:
         raise HTTPException(status_code=400, detail="Email already registered")
+    db.rollback()
 
+
+def _create_user(db: Session, user_in: schemas.UserCreate, password_hash: str) -> models.User:
     user = models.User(
         username=user_in.username,
         email=user_in.email,
-        password_hash=auth.get_password_hash(user_in.password),
+        password_hash=password_hash,
     )
     db.add(user)
     db.commit()
     db.refresh(user)
+    return user
+
+
+def _find_login_user(db: Session, username_or_email: str) -> Optional[models.User]:
+    user = (
+        db.query(models.User)
+        .filter(
+            or_(
+                models.User.username == username_or_email,
+                models.User.email == username_or_email,
+            )
+        )
+        .first()
+    )
+    # Detached, the loaded attributes survive the rollback that returns the
+    # connection to the pool
+    if user is not None:
+        db.expunge(user)
+    db.rollback()
+    return user
+
+
+@router.post("/register", response_model=schemas.UserOut)
+async def register_user(
+    user_in: schemas.UserCreate,
+    response: Response,
+    db: Session = Depends(get_db),
+):
+    await run_in_threadpool(_check_available, db, user_in)
+
+    password_hash = await auth.hash_password_async(user_in.password)
+    user = await run_in_threadpool(_create_user, db, user_in, password_hash)
 
     token = auth.create_access_token({"sub": str(user.id), "username": user.username})
     auth.set_auth_cookie(response, token)
@@ -42,23 +81,14 @@ def register_user(
 
 
 @router.post("/login", response_model=schemas.UserOut)
-def login(
+async def login(
     creds: schemas.UserLogin,
     response: Response,
     db: Session = Depends(get_db),
 ):
-    user = (
-        db.query(models.User)
-        .filter(
-            or_(
-                models.User.username == creds.username_or_email,
-                models.User.email == creds.username_or_email,
-            )
-        )
-        .first()
-    )
+    user = await run_in_threadpool(_find_login_user, db, creds.username_or_email)
 
-    if not user or not auth.verify_password(creds.password, user.password_hash):
+    if not user or not await auth.verify_password_async(creds.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
         )
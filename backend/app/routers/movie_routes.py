@@ -1,64 +1,94 @@
-from typing import Optional, List
+import base64
+from datetime import datetime
+from typing import Iterator, Optional, List, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import case, cast, Float, select, func
+from sqlalchemy import literal_column, select, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 
 from .. import models, schemas, auth
-from ..database import get_db
+from ..database import SessionLocal, get_db, run_cpu_bound
+from ..embedding_engine import SMART_ENGINE, get_embedding_engine
+from ..instrumentation import span, timed
+from ..movie_space import MovieSpace, movie_space_cache, pack_array
+from ..profiles import (
+    apply_favorite_change,
+    apply_rating_change,
+    get_user_profile,
+    get_user_profile_vector,
+    profile_vector,
+    rebuild_user_profile,
+)
+from ..random_sampler import RANDOM_ENGINE, get_random_sampler
+from ..rec_queue import REC_QUEUE_BATCH, rec_queue
+from ..seen import SeenSet, get_seen_set, seen_cache
+from ..scoring import RANDOM_MIN_VOTES
+from ..vector_index import apply_search_settings
 
 import numpy as np
 # from sklearn.manifold import TSNE
 from typing import Optional, List
-TSNE_CACHE = {}  
 
 import os
-LAST_RATINGS_N = int(os.getenv("LAST_RATINGS_N", "10"))
+# > 0: smart mode first pulls this many nearest neighbours through the ANN
+# index and only re-weights those. 0 keeps the exact full-table ranking.
+# Set EMBEDDING_INDEX (app/vector_index.py) along with it; the index is
+# only built when asked for.
+SMART_CANDIDATES = int(os.getenv("SMART_CANDIDATES", "0"))
+# First batch of ranked ids fetched before filtering out seen movies in Python
+UNSEEN_PROBE = int(os.getenv("UNSEEN_PROBE", "32"))
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.movies.space-columnar+json"
+INFLUENCE_TOP_K = 5
+RATING_BATCH_MAX = int(os.getenv("RATING_BATCH_MAX", "5000"))
+HISTORY_PAGE_MAX = 1000
+HISTORY_STREAM_BATCH = 500
 
 router = APIRouter(prefix="/movies", tags=["movies"])
 
 
-from sqlalchemy import case, cast, Float
-
-def get_random_unseen_movie(db: Session, user_id: int) -> Optional[models.Movie]:
-    rated_subq = (
-        select(models.Rating.movie_id).where(models.Rating.user_id == user_id)
-    )
-
-    # 1. Popularty Weight:
-    votes = cast(models.Movie.imdb_votes, Float)
-    rating = cast(models.Movie.imdb_rating, Float)
-
-    popularity_weight = (
-        func.pow(votes + 1.0, 0.7) *
-        func.pow((rating / 10.0), 1.5)
-    )
-
-    # 2. Recency bias:
-    recency = case(
-        (models.Movie.startYear >= 2010, 1.3),
-        (models.Movie.startYear >= 2000, 1.1),
-        else_=1.0
-    )
+@timed("random_rank")
+def random_unseen_ids(db: Session, seen: SeenSet, k: int = 1) -> List[int]:
+    """Up to k distinct weighted-random movie ids outside `seen`."""
+    if RANDOM_ENGINE == "sampler":
+        sampler = get_random_sampler(db)
+        if sampler is not None:
+            ids = run_cpu_bound(sampler.sample_unseen_many, seen, k)
+            if ids:
+                return ids
 
-    weight_expr = popularity_weight * recency
-
-    # 3. Weighted random sampling:
-    #       ORDER BY -ln(random()) / weight
-    weighted_order = -func.ln(func.random()) / weight_expr
+    # Weighted random sampling over the stored weights:
+    #       ORDER BY -ln(random()) / sample_weight
+    weighted_order = -func.ln(func.random()) / models.Movie.sample_weight
 
     stmt = (
-        select(models.Movie)
-        .where(models.Movie.id.not_in(rated_subq))
+        select(models.Movie.id)
 
-        # 4. Exclude obscure movies entirely
-        .where(models.Movie.imdb_votes > 1000)
+        # Exclude obscure movies entirely
+        .where(models.Movie.imdb_votes > RANDOM_MIN_VOTES)
 
         .order_by(weighted_order)
-        .limit(1)
     )
 
-    return db.execute(stmt).scalars().first()
+    return first_unseen_ids(db, stmt, seen, k)
+
+
+def first_unseen_ids(db: Session, stmt, seen: SeenSet, k: int = 1) -> List[int]:
+    """
+    Walk a ranked movie-id query until k ids outside `seen` show up.
+    The first probe is small; if it holds fewer than k unseen ids, one query
+    with LIMIT probe + len(seen) is guaranteed to contain k if they exist.
+    """
+    probe = UNSEEN_PROBE + k - 1
+    ids = db.execute(stmt.limit(probe)).scalars().all()
+    found = seen.unseen(ids, k)
+    if len(found) < k and len(ids) == probe and len(seen) > 0:
+        ids = db.execute(stmt.limit(probe + len(seen))).scalars().all()
+        found = seen.unseen(ids, k)
+    return found
 
 def imdb_rating_weight(rating: float) -> float:
     if rating is None:
@@ -66,356 +96,664 @@ def imdb_rating_weight(rating: float) -> float:
     return float(np.exp(np.log(1.5) * (rating - 6)))
 
 
-def get_favorites(db: Session, user_id: int, limit: Optional[int] = None):
-    return (
-        db.query(models.Favorite)
-        .options(joinedload(models.Favorite.movie))
-        .filter(models.Favorite.user_id == user_id)
-        # .order_by(models.Favorite.movie_id.asc())  # stable, not recency-based
-        .all()
-    )
-
+@timed("profile")
 def compute_user_profile_vector(
     db: Session,
     user_id: int,
 ) -> Optional[List[float]]:
     """
-    Build a simple user preference vector from their ratings.
+    User preference vector from their ratings.
 
     👍 = +1
     👎 = -1
 
-    We average all (embedding * weight) to get a single vector.
+    The average of all (embedding * weight) over the last LAST_RATINGS_N
+    ratings and all favorites, read from the persisted profile (see
+    app/profiles.py) instead of being recomputed.
     """
-    ratings = get_last_n_ratings(db, user_id, n=LAST_RATINGS_N)
-    favorites = get_favorites(db, user_id)
+    return get_user_profile_vector(db, user_id)
 
-    if not ratings and not favorites:
-        return None
 
-    # Collect all embeddings with weights
-    weighted_vectors: List[List[float]] = []
-    weights: List[float] = []
-
-    for r in ratings:
-        emb = r.movie.embedding
-        if emb is None:
-            continue
-
-        # emb is typically a list[float] from pgvector
-        weight = 1.0 if r.rating else -1.0
-        weighted_vectors.append(list(emb))
-        weights.append(weight)
-        
-    # Favorites contribute +1 equally
-    for f in favorites:
-        emb = f.movie.embedding
-        if emb is None:
-            continue
-        weighted_vectors.append(list(emb))
-        weights.append(1.0)
-
-    if not weighted_vectors:
-        return None
+@timed("smart_rank")
+def smart_unseen_ids(db: Session, user_profile: List[float], seen: SeenSet, k: int = 1) -> List[int]:
+    """The k best-scoring movie ids outside `seen` for a profile vector."""
+    if SMART_ENGINE == "numpy":
+        engine = get_embedding_engine(db)
+        if engine is not None:
+            return run_cpu_bound(engine.top_k, user_profile, seen.ids, k)
 
-    dim = len(weighted_vectors[0])
-    agg = [0.0] * dim
-    total_weight = 0.0
+    ids: List[int] = []
+    if SMART_CANDIDATES > 0:
+        apply_search_settings(db, SMART_CANDIDATES)
+        stmt = smart_ann_stmt(user_profile, SMART_CANDIDATES, columns=(models.Movie.id,))
+        ids = seen.unseen(db.execute(stmt.limit(SMART_CANDIDATES)).scalars().all(), k)
 
-    for vec, w in zip(weighted_vectors, weights):
-        for i in range(dim):
-            agg[i] += vec[i] * w
-        total_weight += abs(w)
+    if len(ids) < k:
+        stmt = smart_exact_stmt(user_profile, columns=(models.Movie.id,))
+        ids = first_unseen_ids(db, stmt, seen, k)
 
-    if total_weight == 0:
-        return None
+    return ids
 
-    # Normalize
-    profile = [x / total_weight for x in agg]
-    return profile
 
-def get_last_n_ratings(db: Session, user_id: int, n: int = 15):
+def smart_exact_stmt(user_profile, exclude=None, limit: int = 1, columns=(models.Movie,)):
+    """Rank every movie by distance - quality (sequential scan)."""
+    # Cosine distance = similarity basis
+    distance = models.Movie.embedding.cosine_distance(user_profile)
+
+    # your gentle weight functions, precomputed (see app/scoring.py)
+    score = distance - models.Movie.quality_score
+
+    stmt = select(*columns)
+    if exclude is not None:
+        stmt = stmt.where(models.Movie.id.not_in(exclude))
+    return stmt.order_by(score.asc()).limit(limit)
+
+
+def smart_ann_stmt(user_profile, k: int, exclude=None, limit: int = 1, columns=(models.Movie,)):
+    """
+    Two-stage ranking: the ANN index returns the k nearest movies by pure
+    cosine distance, then only those k rows are re-weighted.
+    """
+    distance = models.Movie.embedding.cosine_distance(user_profile)
+
+    candidates = select(models.Movie.id, distance.label("distance"))
+    if exclude is not None:
+        candidates = candidates.where(models.Movie.id.not_in(exclude))
+    candidates = candidates.order_by(distance).limit(k).subquery()
+
+    score = candidates.c.distance - models.Movie.quality_score
     return (
-        db.query(models.Rating)
-        .options(joinedload(models.Rating.movie))
-        .filter(models.Rating.user_id == user_id)
-        .order_by(models.Rating.created_at.desc())
-        .limit(n)
-        .all()
+        select(*columns)
+        .select_from(models.Movie)
+        .join(candidates, candidates.c.id == models.Movie.id)
+        .order_by(score.asc())
+        .limit(limit)
     )
-    
-def popularity_weight_sql(votes_col):
-    # 0.05 * sqrt(log(votes) / 7)
-    return 0.05 * func.sqrt(func.log(votes_col + 1) / 7.0)
 
 
-def rating_weight_sql(rating_col):
-    # convert rating range 6-10 → p = rating - 5 (range 1–5)
-    # 0.05 * sqrt(log(rating - 5) / 7)
-    return 0.05 * func.sqrt(func.exp(func.ln(5)*(rating_col - 5.0)) / 100.0) - 0.01
+def rated_among(db: Session, user_id: int, ids: List[int]) -> List[int]:
+    """The ids the user has rated; one probe of the (user_id, movie_id) key."""
+    if not ids:
+        return []
+    return list(
+        db.execute(
+            select(models.Rating.movie_id).where(
+                models.Rating.user_id == user_id,
+                models.Rating.movie_id.in_(ids),
+            )
+        ).scalars()
+    )
+
 
-def recency_weight_sql(year_col):
+def recommend_ids(db: Session, user_id: int, mode: str, count: int = 1) -> List[int]:
     """
-    w = sqrt(1.025^(year - 1920))
+    The next `count` unseen movie ids for the user. Served from the user's
+    recommendation queue when it is current; otherwise a batch of
+    REC_QUEUE_BATCH is scored and queued (see app/rec_queue.py).
+
+    The seen set and queue are per process, so a rating written through
+    another worker can be missing from them. The picked ids are checked
+    against ratings; if any were already rated, both caches are dropped and
+    the pick is made once more from a freshly loaded seen set.
     """
-    return 0.0003 * func.sqrt(
-        func.pow(1.09, (year_col - 1920.0))
+    ids = _pick_ids(db, user_id, mode, count)
+    if rated_among(db, user_id, ids):
+        seen_cache.clear(user_id)
+        rec_queue.invalidate(user_id)
+        ids = _pick_ids(db, user_id, mode, count)
+    return ids
+
+
+def _pick_ids(db: Session, user_id: int, mode: str, count: int) -> List[int]:
+    with span("seen"):
+        seen = get_seen_set(db, user_id)
+    profile = None
+    if mode == "smart":
+        with span("profile"):
+            profile = get_user_profile(db, user_id)
+    key = (mode, profile.version if profile is not None else None)
+
+    ids = rec_queue.peek(user_id, key, seen, count)
+    if ids is not None:
+        return ids
+
+    batch = max(count, REC_QUEUE_BATCH)
+    ids = []
+    if profile is not None:
+        user_profile = profile_vector(profile)
+        if user_profile is not None:
+            ids = smart_unseen_ids(db, user_profile, seen, batch)
+    # If there's no good smart candidate, gracefully fall back to random
+    if not ids:
+        ids = random_unseen_ids(db, seen, batch)
+
+    rec_queue.put(user_id, key, ids)
+    return ids[:count]
+
+
+MOVIE_OUT_COLUMNS = (
+    models.Movie.id,
+    models.Movie.title,
+    models.Movie.overview,
+    models.Movie.startYear,
+    models.Movie.imdb_rating,
+    models.Movie.imdb_votes,
+    models.Movie.tmdb_genres,
+    models.Movie.poster_path,
+)
+
+
+@timed("movies_out")
+def movies_out(db: Session, user_id: int, ids: List[int]) -> List[schemas.MovieOut]:
+    """MovieOut for each id, in order, with favorite flags; two queries."""
+    if not ids:
+        return []
+    rows = {
+        row.id: row
+        for row in db.execute(
+            select(*MOVIE_OUT_COLUMNS).where(models.Movie.id.in_(ids))
+        )
+    }
+    favorites = set(
+        db.execute(
+            select(models.Favorite.movie_id).where(
+                models.Favorite.user_id == user_id,
+                models.Favorite.movie_id.in_(ids),
+            )
+        ).scalars()
     )
+    return [
+        schemas.MovieOut(**rows[mid]._mapping, is_favorite=mid in favorites)
+        for mid in ids
+        if mid in rows
+    ]
 
-def get_smart_unseen_movie(db: Session, user_id: int) -> Optional[models.Movie]:
 
-    user_profile = compute_user_profile_vector(db, user_id)
-    if user_profile is None:
-        return None
+def recommend_movies(db: Session, user_id: int, mode: str, count: int = 1) -> List[schemas.MovieOut]:
+    return movies_out(db, user_id, recommend_ids(db, user_id, mode, count))
 
-    rated_subq = (
-        select(models.Rating.movie_id).where(models.Rating.user_id == user_id)
+
+def recommend_next(db: Session, user_id: int, mode: str) -> schemas.MovieOut:
+    """Next unseen movie for the user, shared by the sync and async routes."""
+    movies = recommend_movies(db, user_id, mode, 1)
+    if not movies:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No more unseen movies",
+        )
+    return movies[0]
+
+
+def upsert_rating_stmt(user_id: int, movie_id: int, rating: bool):
+    """
+    One statement that writes the rating and returns everything the write
+    path needs: whether the row was inserted, the row's (created_at, id),
+    the movie title and embedding, and the favorite flag. The previous value
+    comes from locked_rating_stmt, run just before.
+    """
+    upsert = insert(models.Rating).values(user_id=user_id, movie_id=movie_id, rating=rating)
+    upsert = (
+        upsert.on_conflict_do_update(
+            constraint="uq_ratings_user_movie",
+            set_={"rating": upsert.excluded.rating},
+        )
+        .returning(
+            models.Rating.id,
+            models.Rating.movie_id,
+            models.Rating.rating,
+            models.Rating.created_at,
+            literal_column("xmax = 0").label("inserted"),
+        )
+        .cte("upserted")
     )
 
-    # Cosine distance = similarity basis
-    distance = models.Movie.embedding.cosine_distance(user_profile)
+    is_favorite = (
+        select(models.Favorite.id)
+        .where(models.Favorite.user_id == user_id, models.Favorite.movie_id == movie_id)
+        .exists()
+    )
 
-    # your gentle weight functions
-    votes = cast(models.Movie.imdb_votes, Float)
-    rating = cast(models.Movie.imdb_rating, Float)
+    return (
+        select(
+            upsert.c.id,
+            upsert.c.movie_id,
+            upsert.c.rating,
+            upsert.c.created_at,
+            upsert.c.inserted,
+            models.Movie.title,
+            models.Movie.embedding,
+            is_favorite.label("is_favorite"),
+        )
+        .join(models.Movie, models.Movie.id == upsert.c.movie_id)
+    )
 
-    pop_w = popularity_weight_sql(votes)
-    rating_w = rating_weight_sql(rating)
-    recency_w = recency_weight_sql(models.Movie.startYear)
-    # score = distance - pop_w - rating_w - recency_w
-    score = distance - 10 * (pop_w * rating_w) - recency_w
-    
 
-    stmt = (
-        select(models.Movie)
-        .where(models.Movie.id.not_in(rated_subq))
-        .order_by(score.asc())
-        .limit(1)
+def locked_rating_stmt(user_id: int, movie_id: int):
+    """
+    The current rating, row-locked until commit so a concurrent write to the
+    same rating waits instead of reading the same `previous`.
+    """
+    return (
+        select(models.Rating.rating)
+        .where(models.Rating.user_id == user_id, models.Rating.movie_id == movie_id)
+        .with_for_update()
     )
 
-    return db.execute(stmt).scalars().first()
+
+def _constraint_name(orig) -> Optional[str]:
+    diag = getattr(orig, "diag", None)  # psycopg2
+    if diag is not None:
+        return diag.constraint_name
+    return getattr(orig.__cause__, "constraint_name", None)  # asyncpg
+
+
+def rating_fk_error(exc: IntegrityError) -> Optional[HTTPException]:
+    """
+    The HTTP error for a foreign key violation on ratings: the user was
+    deleted meanwhile (401, like any stale session) or the movie doesn't
+    exist (404). None for every other integrity error.
+    """
+    orig = exc.orig
+    code = getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)
+    if code != "23503":
+        return None
+    # Postgres' default names for the two foreign keys in models.Rating
+    if _constraint_name(orig) == "ratings_user_id_fkey":
+        return auth.user_not_found()
+    return HTTPException(status_code=404, detail="Movie not found")
+
+
+def write_rating(db: Session, user_id: int, rating_in: schemas.RatingCreate) -> schemas.RatingOut:
+    """
+    Upsert a rating and apply its profile delta (not committed).
+
+    An existing rating is locked before the upsert, so its previous value
+    is exact. A first rating has no row to lock; if a concurrent request
+    inserted it in between, the upsert updates that row instead, and the
+    profile is rebuilt rather than given a delta from a guessed previous.
+    """
+    try:
+        previous = db.execute(locked_rating_stmt(user_id, rating_in.movie_id)).scalar()
+        row = db.execute(upsert_rating_stmt(user_id, rating_in.movie_id, rating_in.rating)).one()
+    except IntegrityError as exc:
+        db.rollback()
+        error = rating_fk_error(exc)
+        if error is not None:
+            raise error
+        raise
+
+    if previous is None and not row.inserted:
+        rebuild_user_profile(db, user_id)
+    else:
+        apply_rating_change(
+            db,
+            user_id,
+            row.movie_id,
+            previous,
+            row.rating,
+            embedding=row.embedding,
+            rating_key=(row.created_at, row.id),
+        )
+
+    return schemas.RatingOut(
+        movie_id=row.movie_id,
+        movie_title=row.title,
+        rating=row.rating,
+        created_at=row.created_at,
+        is_favorite=row.is_favorite,
+    )
+
+
+def record_rating(db: Session, user_id: int, rating_in: schemas.RatingCreate) -> schemas.RatingOut:
+    out = write_rating(db, user_id, rating_in)
+    db.commit()
+    seen_cache.add(user_id, out.movie_id)
+    return out
+
+
+def rate_and_recommend(
+    db: Session,
+    user_id: int,
+    rating_in: schemas.RatingCreate,
+    mode: str,
+    count: int = 1,
+) -> schemas.RateNextOut:
+    """
+    Record a rating and pick the next movie(s) in the same transaction. The
+    pick already sees the updated profile and excludes the rated movie.
+    """
+    out = write_rating(db, user_id, rating_in)
+    seen_cache.add(user_id, out.movie_id)
+    try:
+        movies = recommend_movies(db, user_id, mode, count)
+        db.commit()
+    except Exception:
+        db.rollback()
+        seen_cache.clear(user_id)  # it already counts the rolled back rating
+        rec_queue.invalidate(user_id)
+        raise
+    return schemas.RateNextOut(
+        rating=out,
+        next=movies[0] if movies else None,
+        upcoming=movies[1:],
+    )
 
 
 @router.get("/random", response_model=schemas.MovieOut)
 def next_movie(
     mode: str = Query("random", pattern="^(random|smart)$"),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
 ):
     """
     mode=random -> uniform random unseen movie (old behavior)
     mode=smart  -> vector-based recommendation based on previous ratings
     """
-    if mode == "smart":
-        movie = get_smart_unseen_movie(db, current_user.id)
-        # If there's no good smart candidate, gracefully fall back to random
-        if not movie:
-            movie = get_random_unseen_movie(db, current_user.id)
-    else:
-        movie = get_random_unseen_movie(db, current_user.id)
-
-    if not movie:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="No more unseen movies",
-        )
-        
-    is_fav = (
-        db.query(models.Favorite.id)
-        .filter(models.Favorite.user_id == current_user.id, models.Favorite.movie_id == movie.id)
-        .first()
-        is not None
-    )
-
-    out = schemas.MovieOut.model_validate(movie, from_attributes=True)
-    out.is_favorite = is_fav
-    return out
-
+    return recommend_next(db, current_user.id, mode)
 
 
 @router.post("/rate", response_model=schemas.RatingOut)
 def rate_movie(
     rating_in: schemas.RatingCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
 ):
-    movie = db.query(models.Movie).filter(models.Movie.id == rating_in.movie_id).first()
-    if not movie:
-        raise HTTPException(status_code=404, detail="Movie not found")
+    return record_rating(db, current_user.id, rating_in)
 
-    rating = (
-        db.query(models.Rating)
-        .filter(
-            models.Rating.user_id == current_user.id,
-            models.Rating.movie_id == rating_in.movie_id,
+
+@router.post("/rate-next", response_model=schemas.RateNextOut)
+def rate_and_next(
+    rating_in: schemas.RatingCreate,
+    mode: str = Query("random", pattern="^(random|smart)$"),
+    count: int = Query(1, ge=1, le=REC_QUEUE_BATCH),
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
+):
+    """
+    POST /movies/rate followed by GET /movies/next in one request and one
+    transaction. `next` is null once every movie has been rated; with
+    count > 1, `upcoming` holds the movies queued after it.
+    """
+    return rate_and_recommend(db, current_user.id, rating_in, mode, count)
+
+
+@router.post("/rate/batch", response_model=schemas.RatingBatchOut)
+def rate_movies_batch(
+    ratings_in: List[schemas.RatingCreate],
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
+):
+    """
+    Import many ratings at once (e.g. from another service). All movie ids
+    are validated in one query, every row is upserted in one statement and
+    the profile is rebuilt once. If a movie appears twice, the last
+    rating wins. Either every rating is stored or none is.
+    """
+    if len(ratings_in) > RATING_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {RATING_BATCH_MAX} ratings per batch",
         )
-        .first()
-    )
+    if not ratings_in:
+        return schemas.RatingBatchOut(imported=0, created=0, updated=0)
 
-    if rating:
-        rating.rating = rating_in.rating
-    else:
-        rating = models.Rating(
-            user_id=current_user.id,
-            movie_id=rating_in.movie_id,
-            rating=rating_in.rating,
+    user_id = current_user.id
+    latest = {r.movie_id: r.rating for r in ratings_in}
+
+    known = set(
+        db.execute(
+            select(models.Movie.id).where(models.Movie.id.in_(list(latest)))
+        ).scalars()
+    )
+    missing = sorted(set(latest) - known)
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Movies not found: {missing[:20]}",
         )
-        db.add(rating)
 
+    upsert = insert(models.Rating).values([
+        {"user_id": user_id, "movie_id": movie_id, "rating": rating}
+        for movie_id, rating in latest.items()
+    ])
+    upsert = upsert.on_conflict_do_update(
+        constraint="uq_ratings_user_movie",
+        set_={"rating": upsert.excluded.rating},
+    ).returning(literal_column("xmax = 0").label("created"))
+    try:
+        created_flags = db.execute(upsert).scalars().all()
+    except IntegrityError as exc:
+        db.rollback()
+        error = rating_fk_error(exc)
+        if error is not None:
+            raise error
+        raise
+
+    rebuild_user_profile(db, user_id)
     db.commit()
-    db.refresh(rating)
+    seen_cache.clear(user_id)
+    rec_queue.invalidate(user_id)
+
+    created = sum(1 for flag in created_flags if flag)
+    return schemas.RatingBatchOut(
+        imported=len(created_flags),
+        created=created,
+        updated=len(created_flags) - created,
+    )
 
-    # NEW: include favorite status in response
-    is_fav = (
-        db.query(models.Favorite.id)
-        .filter(
-            models.Favorite.user_id == current_user.id,
-            models.Favorite.movie_id == movie.id,
+
+@router.get("/next", response_model=list[schemas.MovieOut])
+def next_movies(
+    mode: str = Query("random", pattern="^(random|smart)$"),
+    count: int = Query(1, ge=1, le=REC_QUEUE_BATCH),
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
+):
+    """
+    The next `count` unseen movies, best first (empty once all are rated).
+    Movies stay at the head of the queue until they are rated, so clients
+    can show the first and preload the rest.
+    """
+    return recommend_movies(db, current_user.id, mode, count)
+
+
+def history_stmt(user_id: int, before: Optional[Tuple[datetime, int]] = None):
+    """
+    The user's ratings newest first, only the columns RatingOut needs.
+    Keyset on (created_at, id), served by ix_ratings_user_created.
+    """
+    stmt = (
+        select(
+            models.Rating.id,
+            models.Rating.movie_id,
+            models.Movie.title,
+            models.Rating.rating,
+            models.Rating.created_at,
+            models.Favorite.id.is_not(None).label("is_favorite"),
         )
-        .first()
-        is not None
+        .join(models.Movie, models.Movie.id == models.Rating.movie_id)
+        .outerjoin(
+            models.Favorite,
+            (models.Favorite.user_id == models.Rating.user_id)
+            & (models.Favorite.movie_id == models.Rating.movie_id),
+        )
+        .where(models.Rating.user_id == user_id)
+        .order_by(models.Rating.created_at.desc(), models.Rating.id.desc())
     )
+    if before is not None:
+        stmt = stmt.where(
+            tuple_(models.Rating.created_at, models.Rating.id) < tuple_(*before)
+        )
+    return stmt
+
+
+def encode_history_cursor(created_at: datetime, rating_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{rating_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, rating_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(rating_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
+
+def _history_item(row) -> schemas.RatingOut:
     return schemas.RatingOut(
-        movie_id=movie.id,                 # FIX
-        movie_title=movie.title,
-        rating=rating.rating,
-        created_at=rating.created_at,
-        is_favorite=is_fav,                # FIX (optional but consistent)
+        movie_id=row.movie_id,
+        movie_title=row.title,
+        rating=row.rating,
+        created_at=row.created_at,
+        is_favorite=row.is_favorite,
     )
 
 
+def _stream_history(user_id: int, before, ndjson: bool) -> Iterator[str]:
+    """
+    Serialize the history row by row from a server-side cursor. Runs after
+    the handler has returned, so it uses its own session.
+    """
+    with SessionLocal() as db:
+        result = db.execute(
+            history_stmt(user_id, before),
+            execution_options={"yield_per": HISTORY_STREAM_BATCH},
+        )
+        first = True
+        if not ndjson:
+            yield "["
+        for row in result:
+            item = _history_item(row).model_dump_json()
+            if ndjson:
+                yield item + "\n"
+            else:
+                yield item if first else "," + item
+            first = False
+        if not ndjson:
+            yield "]"
+
+
 @router.get("/history", response_model=list[schemas.RatingOut])
 def get_history(
+    limit: Optional[int] = Query(None, ge=1, le=HISTORY_PAGE_MAX),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
 ):
-    ratings = (
-        db.query(models.Rating)
-        .options(joinedload(models.Rating.movie))
-        .filter(models.Rating.user_id == current_user.id)
-        .order_by(models.Rating.created_at.desc())
-        .all()
-    )
+    """
+    Ratings newest first.
 
-    fav_ids = {
-        mid for (mid,) in (
-            db.query(models.Favorite.movie_id)
-            .filter(models.Favorite.user_id == current_user.id)
-            .all()
+    Without `limit` the whole history is streamed (a JSON array, or one
+    object per line with format=ndjson), so memory stays flat however long
+    it is. With `limit` one page is returned; the X-Next-Cursor response
+    header, when present, is the `cursor` for the next page.
+    """
+    before = decode_history_cursor(cursor) if cursor else None
+    ndjson = format == "ndjson"
+    media_type = "application/x-ndjson" if ndjson else "application/json"
+
+    if limit is None:
+        return StreamingResponse(
+            _stream_history(current_user.id, before, ndjson),
+            media_type=media_type,
         )
-    }
 
-    return [
-        schemas.RatingOut(
-            movie_id=r.movie.id,
-            movie_title=r.movie.title,
-            rating=r.rating,
-            created_at=r.created_at,
-            is_favorite=(r.movie.id in fav_ids),
-        )
-        for r in ratings
-    ]
+    rows = db.execute(history_stmt(current_user.id, before).limit(limit + 1)).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_history_cursor(rows[-1].created_at, rows[-1].id)
+
+    items = [_history_item(row).model_dump_json() for row in rows]
+    content = "".join(item + "\n" for item in items) if ndjson else "[" + ",".join(items) + "]"
+    return Response(content=content, media_type=media_type, headers=headers)
 
 
 @router.post("/history/reset")
 def reset_history(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
 ):
     db.query(models.Rating).filter(models.Rating.user_id == current_user.id).delete()
+    rebuild_user_profile(db, current_user.id)
     db.commit()
+    seen_cache.clear(current_user.id)
+    rec_queue.invalidate(current_user.id)
     return {"detail": "History reset"}
 
-TSNE_CACHE = {}   # global cache: stores UMAP, movie projections, etc.
+def _current_movie_space(db: Session) -> Optional[MovieSpace]:
+    space = movie_space_cache.get(db)
+    if space is None and movie_space_cache.building:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Movie map is being built. Try again shortly.",
+            headers={"Retry-After": "30"},
+        )
+    return space
+
+
+def _user_point(db: Session, space: MovieSpace, user_id: int) -> Optional[dict]:
+    user_profile = compute_user_profile_vector(db, user_id)
+    if user_profile is None:
+        return None
+    # UMAP transform – very fast (no retraining!)
+    user_2d = space.project(user_profile)
+    return {"x": float(user_2d[0]), "y": float(user_2d[1])}
+
+
+def _user_ratings(db: Session, user_id: int):
+    return db.execute(
+        select(models.Rating.movie_id, models.Rating.rating)
+        .where(models.Rating.user_id == user_id)
+    ).all()
 
 
 @router.get("/space")
 def movie_space(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(json|columnar)$"),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
 ):
     """
     Returns 2D UMAP embeddings for all movies + the user's preference vector.
-    Uses a global cache so UMAP is computed only once for the lifetime of the server.
-    """
-    # ---- Step 1: Fetch all movies ----
-    movies = db.query(models.Movie).all()
-    if not movies:
-        return {"points": [], "user_point": None}
+    The projection comes from the offline artifact (see app/movie_space.py),
+    loaded once per process and re-validated against the catalog version.
 
-    movie_ids = []
-    movie_titles = []
-    embs = []
-
-    for m in movies:
-        if m.embedding is None:
-            continue
-        movie_ids.append(m.id)
-        movie_titles.append(m.title)
-        embs.append(list(m.embedding))
+    format=columnar (or Accept: application/vnd.movies.space-columnar+json)
+    returns parallel arrays instead of one dict per movie: ids/x/y as base64
+    little-endian int32/float32, titles as a list and rating flags as base64
+    int8 (1 liked, 0 disliked, -1 unseen).
+    """
+    columnar = format == "columnar" or (
+        format is None and COLUMNAR_MEDIA_TYPE in request.headers.get("accept", "")
+    )
 
-    if not embs:
+    space = _current_movie_space(db)
+    if space is None:
+        if columnar:
+            return {"count": 0, "ids": "", "x": "", "y": "", "titles": [], "rating": "", "user_point": None}
         return {"points": [], "user_point": None}
 
-    X = np.array(embs, dtype=float)
-    num_movies = X.shape[0]
-
-    # ---- Step 2: If cache is missing or stale, rebuild UMAP ----
-    cache_key = "umap"
-
-    need_rebuild = (
-        cache_key not in TSNE_CACHE
-        or TSNE_CACHE[cache_key]["num_movies"] != num_movies
-    )
+    user_point = _user_point(db, space, current_user.id)
+    ratings = _user_ratings(db, current_user.id)
 
-    if need_rebuild:
-        import umap
-        # Train UMAP one single time
-        reducer = umap.UMAP(
-            n_components=2,
-            n_neighbors=400,
-            min_dist=0.1,
-            metric="cosine",
-            random_state=42,
-        )
-        movie_coords = reducer.fit_transform(X)
-
-        TSNE_CACHE[cache_key] = {
-            "reducer": reducer,
-            "movie_coords": movie_coords,
-            "movie_ids": movie_ids,
-            "movie_titles": movie_titles,
-            "X": X,                # original embeddings
-            "num_movies": num_movies,
+    if columnar:
+        return {
+            **space.static_columns(),
+            "static_etag": space.etag,
+            "rating": pack_array(space.rating_flags(ratings), "<i1"),
+            "user_point": user_point,
         }
-    else:
-        reducer = TSNE_CACHE[cache_key]["reducer"]
-        movie_coords = TSNE_CACHE[cache_key]["movie_coords"]
-        movie_ids = TSNE_CACHE[cache_key]["movie_ids"]
-        movie_titles = TSNE_CACHE[cache_key]["movie_titles"]
-
-    # ---- Step 3: Compute user vector and project it through cached UMAP ----
-    user_profile = compute_user_profile_vector(db, current_user.id)
-
-    if user_profile is not None:
-        # UMAP transform – very fast (no retraining!)
-        user_vec = np.array(user_profile, dtype=float)
-        user_2d = reducer.transform([user_vec])[0]
-        user_point = {"x": float(user_2d[0]), "y": float(user_2d[1])}
-    else:
-        user_point = None
 
-    # ---- Step 4: Color coding: liked, disliked, unseen ----
-    ratings = (
-        db.query(models.Rating)
-        .filter(models.Rating.user_id == current_user.id)
-        .all()
-    )
-    rating_map = {r.movie_id: r.rating for r in ratings}
+    # ---- Color coding: liked, disliked, unseen ----
+    rating_map = dict(ratings)
 
     points = []
-    for mid, title, coord in zip(movie_ids, movie_titles, movie_coords):
+    for mid, title, coord in zip(space.ids.tolist(), space.titles, space.coords):
         rating = rating_map.get(mid, None)
         points.append({
             "id": mid,
@@ -427,61 +765,190 @@ def movie_space(
 
     return {"points": points, "user_point": user_point}
 
-@router.get("/influence")
-def movie_influence(
-    movie_id: int,
+
+@router.get("/space/static")
+def movie_space_static(
+    request: Request,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
 ):
-    # Fetch the current recommended movie
-    target_movie = db.query(models.Movie).filter(models.Movie.id == movie_id).first()
-    if not target_movie:
-        raise HTTPException(status_code=404, detail="Movie not found")
+    """
+    The user-independent part of the map as one binary blob (layout in
+    MovieSpace.static_payload), with an ETag so browsers revalidate with
+    If-None-Match and get a 304 until the projection changes.
+    """
+    space = _current_movie_space(db)
+    if space is None:
+        raise HTTPException(status_code=404, detail="No movie map available")
+
+    headers = {"ETag": space.etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == space.etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(
+        content=space.static_payload(),
+        media_type="application/octet-stream",
+        headers=headers,
+    )
 
-    target_emb = np.array(target_movie.embedding, dtype=float)
 
-    # Fetch all rated movies for the user
-    ratings = (
-        db.query(models.Rating)
-        .options(joinedload(models.Rating.movie))
-        .filter(models.Rating.user_id == current_user.id)
-        .all()
+@router.get("/space/overlay")
+def movie_space_overlay(
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
+):
+    """
+    Per-user part of the map: the projected profile and the user's liked /
+    disliked movie ids (base64 little-endian int32). `static_etag` says which
+    static part it belongs to.
+    """
+    space = _current_movie_space(db)
+    if space is None:
+        return {"static_etag": None, "user_point": None, "liked": "", "disliked": ""}
+
+    ratings = _user_ratings(db, current_user.id)
+    return {
+        "static_etag": space.etag,
+        "user_point": _user_point(db, space, current_user.id),
+        "liked": pack_array([mid for mid, r in ratings if r], "<i4"),
+        "disliked": pack_array([mid for mid, r in ratings if not r], "<i4"),
+    }
+
+@router.get("/space/tile")
+def movie_space_tile(
+    xmin: Optional[float] = None,
+    ymin: Optional[float] = None,
+    xmax: Optional[float] = None,
+    ymax: Optional[float] = None,
+    zoom: int = Query(0, ge=0, le=20),
+    limit: int = Query(5000, ge=1, le=20000),
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
+):
+    """
+    Points of the map inside a bounding box (default: the whole map).
+    Below SPACE_MAX_ZOOM the result is a popularity-thinned sample; at high
+    zoom it is every point in view. `exact` tells which one you got.
+    """
+    space = _current_movie_space(db)
+    if space is None:
+        return {"bounds": None, "zoom": zoom, "exact": True, "points": []}
+
+    grid = space.grid()
+    lo_x, lo_y, hi_x, hi_y = grid.bounds
+    idx, exact = grid.query(
+        lo_x if xmin is None else xmin,
+        lo_y if ymin is None else ymin,
+        hi_x if xmax is None else xmax,
+        hi_y if ymax is None else ymax,
+        zoom=zoom,
+        limit=limit,
     )
 
-    influences = []
+    rating_map = dict(_user_ratings(db, current_user.id))
+    points = []
+    for i in idx.tolist():
+        mid = int(space.ids[i])
+        points.append({
+            "id": mid,
+            "title": space.titles[i],
+            "x": float(space.coords[i, 0]),
+            "y": float(space.coords[i, 1]),
+            "rating": rating_map.get(mid, None),
+        })
 
-    for r in ratings:
-        emb = np.array(r.movie.embedding, dtype=float)
-        weight = 1 if r.rating else -1
+    return {
+        "bounds": grid.bounds,
+        "zoom": zoom,
+        "exact": exact,
+        "static_etag": space.etag,
+        "points": points,
+    }
 
-        # cosine weighted influence
-        influence = float(
-            np.dot(emb * weight, target_emb)
-            / (np.linalg.norm(emb) * np.linalg.norm(target_emb))
+@router.get("/influence")
+def movie_influence(
+    movie_id: int,
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
+):
+    """
+    The user's liked movies most similar (cosine) to `movie_id`, top 5.
+    Only positive ratings are considered, and the ranking happens either
+    against the in-memory embedding matrix or inside Postgres.
+    """
+    engine = get_embedding_engine(db) if SMART_ENGINE == "numpy" else None
+    if engine is not None:
+        liked_ids = db.execute(
+            select(models.Rating.movie_id).where(
+                models.Rating.user_id == current_user.id,
+                models.Rating.rating.is_(True),
+            )
+        ).scalars().all()
+        result = engine.similarities(movie_id, liked_ids)
+        if result is not None:
+            return _top_influences(db, *result)
+
+    # Cosine similarity computed by pgvector, top 5 picked by the database
+    target = db.execute(
+        select(models.Movie.embedding).where(models.Movie.id == movie_id)
+    ).first()
+    if target is None:
+        raise HTTPException(status_code=404, detail="Movie not found")
+    if target.embedding is None:
+        return []
+
+    distance = models.Movie.embedding.cosine_distance(target.embedding)
+    rows = db.execute(
+        select(models.Movie.id, models.Movie.title, (1 - distance).label("influence"))
+        .join(models.Rating, models.Rating.movie_id == models.Movie.id)
+        .where(
+            models.Rating.user_id == current_user.id,
+            models.Rating.rating.is_(True),
+            models.Movie.embedding.is_not(None),
         )
+        .order_by(distance.asc())
+        .limit(INFLUENCE_TOP_K)
+    ).all()
 
-        influences.append({
-            "movie_id": r.movie.id,
-            "movie_title": r.movie.title,
-            "rating": r.rating,
-            "influence": influence,
-        })
+    return [
+        {
+            "movie_id": mid,
+            "movie_title": title,
+            "rating": True,
+            "influence": float(influence),
+        }
+        for mid, title, influence in rows
+    ]
 
-    # Keep positively rated movies
-    positive_influences = [inf for inf in influences if inf["rating"] == True]
 
-    # Sort by highest positive influence
-    positive_influences.sort(key=lambda x: x["influence"], reverse=True)
+def _top_influences(db: Session, ids: np.ndarray, sims: np.ndarray) -> list:
+    k = min(INFLUENCE_TOP_K, len(ids))
+    if k == 0:
+        return []
+    top = np.argpartition(-sims, k - 1)[:k]
+    top = top[np.argsort(-sims[top], kind="stable")]
 
-    # Return top 5
-    return positive_influences[:5]
+    top_ids = ids[top].tolist()
+    titles = dict(
+        db.execute(
+            select(models.Movie.id, models.Movie.title).where(models.Movie.id.in_(top_ids))
+        ).all()
+    )
+    return [
+        {
+            "movie_id": mid,
+            "movie_title": titles.get(mid),
+            "rating": True,
+            "influence": float(sim),
+        }
+        for mid, sim in zip(top_ids, sims[top].tolist())
+    ]
 
 
 @router.post("/favorite/toggle")
 def toggle_favorite(
     payload: schemas.FavoriteToggleIn,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
 ):
     movie = db.query(models.Movie).filter(models.Movie.id == payload.movie_id).first()
     if not movie:
@@ -498,6 +965,8 @@ def toggle_favorite(
 
     if existing:
         db.delete(existing)
+        db.flush()
+        apply_favorite_change(db, current_user.id, payload.movie_id, added=False)
         db.commit()
         return {"movie_id": payload.movie_id, "is_favorite": False}
 
@@ -515,6 +984,8 @@ def toggle_favorite(
 
     fav = models.Favorite(user_id=current_user.id, movie_id=payload.movie_id)
     db.add(fav)
+    db.flush()
+    apply_favorite_change(db, current_user.id, payload.movie_id, added=True)
     db.commit()
     return {"movie_id": payload.movie_id, "is_favorite": True}
 
@@ -522,7 +993,7 @@ def toggle_favorite(
 @router.get("/favorites", response_model=list[schemas.FavoriteOut])
 def list_favorites(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
 ):
     favs = (
         db.query(models.Favorite)
@@ -1,7 +1,7 @@
 from datetime import datetime
 from pydantic import BaseModel, EmailStr
 from pydantic.config import ConfigDict
-from typing import Optional
+from typing import List, Optional
 
 
 # User
@@ -55,6 +55,16 @@ class RatingOut(BaseModel):
     created_at: datetime
     is_favorite: bool = False
 
+class RatingBatchOut(BaseModel):
+    imported: int
+    created: int
+    updated: int
+
+class RateNextOut(BaseModel):
+    rating: RatingOut
+    next: Optional[MovieOut] = None  # None when every movie has been rated
+    upcoming: List[MovieOut] = []    # queued after `next` when count > 1
+
 class FavoriteToggleIn(BaseModel):
     movie_id: int
 
@@ -0,0 +1,117 @@
+"""
+Static quality weights shared by the recommendation queries.
+
+These only depend on catalog columns (votes, IMDB rating, release year), so
+they are evaluated once per movie and stored on the row instead of per row
+and per request:
+
+    movies.quality_score  = smart_quality_sql()
+    movies.sample_weight  = random_weight_sql()
+
+refresh_movie_scores() writes them. It runs inside every catalog load
+transaction (initialize_db), from the migration that adds the columns, and
+from app/scripts/reweight_movies.py, which has to be run after changing a
+formula below. The recommendation queries, the NumPy engine and the random
+sampler only read the stored columns; the last two rebuild their snapshots
+when the scores version in catalog_meta moves (see app/catalog.py).
+"""
+
+from typing import Optional, Sequence
+
+from sqlalchemy import Float, case, cast, func, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection
+
+from . import models
+from .catalog import SCORES_VERSION_KEY
+
+# Random mode never suggests movies with this many votes or fewer
+RANDOM_MIN_VOTES = 1000
+
+
+def popularity_weight_sql(votes_col):
+    # 0.05 * sqrt(log(votes) / 7)
+    return 0.05 * func.sqrt(func.log(votes_col + 1) / 7.0)
+
+
+def rating_weight_sql(rating_col):
+    # convert rating range 6-10 → p = rating - 5 (range 1–5)
+    # 0.05 * sqrt(log(rating - 5) / 7)
+    return 0.05 * func.sqrt(func.exp(func.ln(5)*(rating_col - 5.0)) / 100.0) - 0.01
+
+def recency_weight_sql(year_col):
+    """
+    w = sqrt(1.025^(year - 1920))
+    """
+    return 0.0003 * func.sqrt(
+        func.pow(1.09, (year_col - 1920.0))
+    )
+
+
+def smart_quality_sql():
+    """
+    Bonus subtracted from the cosine distance in smart mode:
+        score = distance - quality
+    """
+    votes = cast(models.Movie.imdb_votes, Float)
+    rating = cast(models.Movie.imdb_rating, Float)
+
+    pop_w = popularity_weight_sql(votes)
+    rating_w = rating_weight_sql(rating)
+    recency_w = recency_weight_sql(models.Movie.startYear)
+    # score = distance - pop_w - rating_w - recency_w
+    return 10 * (pop_w * rating_w) + recency_w
+
+
+def random_weight_sql():
+    """Sampling weight of a movie in random mode."""
+    # 1. Popularty Weight:
+    votes = cast(models.Movie.imdb_votes, Float)
+    rating = cast(models.Movie.imdb_rating, Float)
+
+    popularity_weight = (
+        func.pow(votes + 1.0, 0.7) *
+        func.pow((rating / 10.0), 1.5)
+    )
+
+    # 2. Recency bias:
+    recency = case(
+        (models.Movie.startYear >= 2010, 1.3),
+        (models.Movie.startYear >= 2000, 1.1),
+        else_=1.0
+    )
+
+    return popularity_weight * recency
+
+
+def refresh_movie_scores(conn: Connection, ids: Optional[Sequence[int]] = None) -> int:
+    """
+    Recompute quality_score and sample_weight for every movie, or only for
+    `ids`. Rows whose stored values are already current are left alone, so a
+    refresh after a delta load only rewrites the new rows. If any row
+    changed, the scores version is bumped in the same transaction. Returns
+    the number of rows updated.
+    """
+    quality = smart_quality_sql()
+    weight = random_weight_sql()
+    stmt = (
+        update(models.Movie)
+        .where(
+            or_(
+                models.Movie.quality_score.is_distinct_from(quality),
+                models.Movie.sample_weight.is_distinct_from(weight),
+            )
+        )
+        .values(quality_score=quality, sample_weight=weight)
+    )
+    if ids is not None:
+        stmt = stmt.where(models.Movie.id.in_(ids))
+    updated = conn.execute(stmt).rowcount
+
+    if updated:
+        bump = insert(models.CatalogMeta).values(key=SCORES_VERSION_KEY, value=1)
+        conn.execute(bump.on_conflict_do_update(
+            index_elements=[models.CatalogMeta.key],
+            set_={"value": models.CatalogMeta.value + 1},
+        ))
+    return updated
@@ -0,0 +1,141 @@
+"""
+Recall / latency benchmark for the two-stage ANN smart query.
+
+For a set of synthetic user profiles (averages of random liked/disliked
+movie embeddings) it runs the exact smart ranking and the ANN ranking for
+every combination of candidate count and search parameter, then reports
+recall@1, recall@10 and latency percentiles for both.
+
+    python -m app.scripts.benchmark_ann --queries 100 --k 100,200 \
+        --ef-search 40,100,200 --probes 5,10,20
+
+Use the numbers to pick SMART_CANDIDATES, HNSW_EF_SEARCH and IVFFLAT_PROBES.
+"""
+
+import argparse
+import json
+import time
+from typing import List, Tuple
+
+import numpy as np
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import Movie
+from app.profiles import LAST_RATINGS_N
+from app.routers.movie_routes import smart_ann_stmt, smart_exact_stmt
+from app.vector_index import INDEX_NAME, apply_search_settings
+
+TOP_N = 10
+
+
+def int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def sample_profiles(db: Session, n: int, seed: int) -> List[List[float]]:
+    """Profiles shaped like compute_user_profile_vector output."""
+    embeddings = np.stack([
+        np.asarray(e, dtype=np.float32)
+        for e in db.execute(
+            select(Movie.embedding).where(Movie.embedding.is_not(None))
+        ).scalars()
+    ])
+    rng = np.random.default_rng(seed)
+
+    profiles = []
+    for _ in range(n):
+        rows = rng.choice(len(embeddings), size=LAST_RATINGS_N, replace=False)
+        signs = rng.choice([1.0, -1.0], size=LAST_RATINGS_N, p=[0.7, 0.3])
+        profile = (embeddings[rows] * signs[:, None]).sum(axis=0) / LAST_RATINGS_N
+        profiles.append(profile.tolist())
+    return profiles
+
+
+def run_ids(db: Session, stmt) -> Tuple[List[int], float]:
+    start = time.perf_counter()
+    ids = [m.id for m in db.execute(stmt).scalars()]
+    return ids, (time.perf_counter() - start) * 1000.0
+
+
+def percentiles(samples: List[float]) -> dict:
+    arr = np.asarray(samples)
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p95_ms": round(float(np.percentile(arr, 95)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int_list, default=[100, 200], help="SMART_CANDIDATES values")
+    parser.add_argument("--ef-search", type=int_list, default=[40, 100, 200])
+    parser.add_argument("--probes", type=int_list, default=[10])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    args = parser.parse_args()
+
+    db: Session = SessionLocal()
+    try:
+        indexdef = db.execute(
+            text("SELECT indexdef FROM pg_indexes WHERE indexname = :name"),
+            {"name": INDEX_NAME},
+        ).scalar()
+        print("ANN index:", indexdef or "missing (ANN numbers will reflect a sequential scan)")
+
+        profiles = sample_profiles(db, args.queries, args.seed)
+        print(f"Running {len(profiles)} profiles, top {TOP_N}...")
+
+        exact_ids, exact_ms = [], []
+        for profile in profiles:
+            ids, ms = run_ids(db, smart_exact_stmt(profile, limit=TOP_N))
+            exact_ids.append(ids)
+            exact_ms.append(ms)
+        db.rollback()
+
+        results = {"queries": len(profiles), "exact": percentiles(exact_ms), "ann": []}
+        print(f"exact: {results['exact']}")
+
+        for k in args.k:
+            for ef in args.ef_search:
+                for probes in args.probes:
+                    hits1, hits10, ann_ms = 0, 0.0, []
+                    for profile, truth in zip(profiles, exact_ids):
+                        apply_search_settings(db, k, ef_search=ef, probes=probes)
+                        ids, ms = run_ids(db, smart_ann_stmt(profile, k, limit=TOP_N))
+                        db.rollback()
+
+                        ann_ms.append(ms)
+                        if ids and truth and ids[0] == truth[0]:
+                            hits1 += 1
+                        if truth:
+                            hits10 += len(set(ids) & set(truth)) / len(truth)
+
+                    row = {
+                        "k": k,
+                        "ef_search": ef,
+                        "probes": probes,
+                        "recall@1": round(hits1 / len(profiles), 4),
+                        "recall@10": round(hits10 / len(profiles), 4),
+                        **percentiles(ann_ms),
+                    }
+                    results["ann"].append(row)
+                    print(
+                        f"k={k:<5} ef_search={ef:<5} probes={probes:<4} "
+                        f"recall@1={row['recall@1']:.3f} recall@10={row['recall@10']:.3f} "
+                        f"p50={row['p50_ms']}ms p95={row['p95_ms']}ms"
+                    )
+
+        if args.json_path:
+            with open(args.json_path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+            print(f"Wrote {args.json_path}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Fit the /movies/space UMAP projection offline and write it to disk.
+
+    python -m app.scripts.build_movie_space [--output PATH] [--force]
+
+Skips the fit when the existing artifact already matches the current
+catalog version, so it is safe to run on every boot after initialize_db.
+"""
+
+import argparse
+import logging
+import time
+from pathlib import Path
+
+from sqlalchemy.orm import Session
+
+from app.catalog import catalog_version
+from app.database import SessionLocal
+from app.movie_space import (
+    MOVIE_SPACE_PATH,
+    fit_movie_space,
+    load_movie_space,
+    save_movie_space,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the movie space artifact.")
+    parser.add_argument("--output", type=Path, default=MOVIE_SPACE_PATH)
+    parser.add_argument("--force", action="store_true", help="refit even if the artifact is current")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    db: Session = SessionLocal()
+    try:
+        version = catalog_version(db)
+        if not version[0]:
+            print("Catalog is empty. Nothing to project.")
+            return
+
+        existing = load_movie_space(args.output)
+        if existing is not None and existing.version == version and not args.force:
+            print(f"{args.output} is current for catalog {version}. Skipping.")
+            return
+
+        print(f"Fitting UMAP for catalog {version}...")
+        start = time.perf_counter()
+        space = fit_movie_space(db, version)
+        if space is None:
+            print("No movies with embeddings. Nothing to project.")
+            return
+        save_movie_space(space, args.output)
+        print(f"Wrote {len(space)} points to {args.output} in {time.perf_counter() - start:.1f}s.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
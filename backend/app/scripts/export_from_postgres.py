@@ -1,7 +1,27 @@
+"""
+Export the movie catalog from Postgres.
+
+    python -m app.scripts.export_from_postgres [--format tsv|columnar]
+        [--output PATH] [--since-id N]
+
+- tsv: the movies.tsv layout read by initialize_db (one text column per
+  embedding dimension, max-precision floats).
+- columnar: an export directory (see app/catalog_files.py) with the
+  embeddings as one float32 .npy matrix and metadata as typed columns,
+  streamed through a server-side cursor. --since-id writes a delta with
+  only the movies added after that id; the previous export's max_id is in
+  its manifest.json.
+"""
+
+import argparse
 import csv
+import time
+from pathlib import Path
+
 from sqlalchemy.orm import Session
 
-from app.database import SessionLocal
+from app.catalog_files import write_catalog_export
+from app.database import SessionLocal, engine
 from app.models import Movie
 
 # Highest practical precision for text round-tripping of IEEE-754 double
@@ -10,10 +30,15 @@ def f64_str(x) -> str:
     return format(float(x), ".17g")  # round-trip safe
 
 
-def export_movies_to_tsv(output_path: str = "movies.tsv") -> None:
+def export_movies_to_tsv(output_path: str = "movies.tsv", since_id: int = 0) -> None:
     db: Session = SessionLocal()
     try:
-        movies = db.query(Movie).yield_per(1000)
+        movies = (
+            db.query(Movie)
+            .filter(Movie.id > since_id)
+            .order_by(Movie.id)
+            .yield_per(1000)
+        )
 
         base_fields = [
             "id", "title", "startYear", "imdb_rating", "imdb_votes",
@@ -51,5 +76,30 @@ def export_movies_to_tsv(output_path: str = "movies.tsv") -> None:
         db.close()
 
 
+def export_movies_columnar(output_path: Path, since_id: int = 0) -> None:
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        manifest = write_catalog_export(conn, output_path, since_id=since_id)
+    elapsed = time.perf_counter() - start
+    kind = f"delta after id {since_id}" if since_id else "full export"
+    print(
+        f"Exported {manifest['count']} movies ({kind}, max id {manifest['max_id']}) "
+        f"to {output_path} in {elapsed:.1f}s."
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the movie catalog.")
+    parser.add_argument("--format", choices=["tsv", "columnar"], default="tsv")
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--since-id", type=int, default=0, help="only export movies with a larger id")
+    args = parser.parse_args()
+
+    if args.format == "columnar":
+        export_movies_columnar(args.output or Path("movies_export"), args.since_id)
+    else:
+        export_movies_to_tsv(str(args.output or "movies.tsv"), args.since_id)
+
+
 if __name__ == "__main__":
-    export_movies_to_tsv("movies.tsv")
+    main()
@@ -6,18 +6,45 @@ Initialize PostgreSQL movie database from TSV movie data.
 - Loads precomputed 128-dim pgvector embeddings from TSV
 - Stores vectors directly into Postgres (pgvector)
 - Runs exactly once (idempotent)
+- Fills the precomputed score columns (quality_score, sample_weight) in the
+  same transaction as the rows, so no reader ever sees them unscored
+
+Two load modes (INIT_DB_MODE or --mode):
+
+- copy (default): TSV rows are converted to COPY text format in a process
+  pool, chunk by chunk, and streamed into one `COPY movies FROM STDIN`
+  transaction. No ORM objects are created. COPY only takes a ROW EXCLUSIVE
+  lock, so the API keeps reading movies while it runs (entrypoint.sh loads
+  in the background). With --offline, for databases nothing is serving
+  from, secondary indexes are also dropped for the load and rebuilt after.
+- orm: the original row-by-row ORM insert, in batches.
+
+With --from-export DIR the movies come from a columnar export written by
+export_from_postgres --format columnar instead of the TSV. Exports keep
+their ids and rows that already exist are skipped, so a --since-id delta
+can be applied on top of a loaded database.
 """
 
+import argparse
 import csv
+import logging
+import os
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
 
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import OperationalError
 
+from app.catalog_files import CatalogExport
 from app.database import SessionLocal, engine, Base
+from app.migrations import run_migrations
 from app.models import Movie, User, Rating, Favorite
+from app.scoring import refresh_movie_scores
+from app.vector_index import INDEX_NAME, ensure_embedding_index
 
 
 # CONFIG
@@ -25,6 +52,18 @@ TSV_PATH = Path(__file__).resolve().parents[2] / "data" / "movies.tsv"
 MAX_DB_WAIT_SECONDS = 180
 DB_RETRY_INTERVAL = 2
 
+INIT_DB_MODE = os.getenv("INIT_DB_MODE", "copy").lower()
+COPY_CHUNK_ROWS = 2000
+EMBEDDING_DIM = 128
+
+COPY_COLUMNS = (
+    "title", "startYear", "imdb_rating", "imdb_votes",
+    "overview", "tmdb_genres", "poster_path", "embedding",
+)
+
+# Serializes concurrent initializers (e.g. several containers booting at once)
+_INIT_LOCK_KEY = 7_310_011
+
 print("TSV exists:", TSV_PATH.exists())
 
 
@@ -52,30 +91,26 @@ def database_already_initialized(db: Session) -> bool:
     return db.query(Movie.id).limit(1).first() is not None
 
 
-def main():
-    wait_for_db()
+# ORM mode
 
-    # Ensure pgvector is enabled
-    with engine.begin() as conn:
-        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+def _commit_orm_batch(db: Session, batch: List[Movie]) -> None:
+    db.add_all(batch)
+    db.flush()
+    refresh_movie_scores(db.connection(), ids=[movie.id for movie in batch])
+    db.commit()
+    db.expunge_all()
 
-    # Ensure tables exist BEFORE querying them
-    Base.metadata.create_all(bind=engine)
 
+def load_with_orm(tsv_path: Path) -> int:
     db: Session = SessionLocal()
 
     BATCH_SIZE = 250
     total_inserted = 0
 
     try:
-        # Idempotency guard
-        if database_already_initialized(db):
-            print("Database already initialized. Exiting init.")
-            return
-
         batch = []
 
-        with TSV_PATH.open(newline="", encoding="utf-8") as f:
+        with tsv_path.open(newline="", encoding="utf-8") as f:
             reader = csv.DictReader(f, delimiter="\t")
 
             for row in reader:
@@ -100,27 +135,317 @@ def main():
                     )
                 )
 
-                
+
                 if len(batch) >= BATCH_SIZE:
-                    db.add_all(batch)
-                    db.commit()
+                    _commit_orm_batch(db, batch)
                     total_inserted += len(batch)
                     batch.clear()
-                    db.expunge_all()
-                
-                    
+
+
             if batch:
-                db.add_all(batch)
-                db.commit()
+                _commit_orm_batch(db, batch)
                 total_inserted += len(batch)
-                db.expunge_all()
+
+    finally:
+        db.close()
+
+    return total_inserted
+
+
+# COPY mode
+
+def _copy_escape(value: Optional[str]) -> str:
+    if value is None:
+        return r"\N"
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copy_number(value, cast) -> str:
+    if value is None or value == "":
+        return r"\N"
+    return str(cast(value))
+
+
+def convert_chunk(header: Sequence[str], rows: List[List[str]]) -> Tuple[str, int]:
+    """
+    Turn raw TSV rows into COPY text lines (runs in a worker process).
+    Returns (text, number of rows).
+    """
+    col = {name: i for i, name in enumerate(header)}
+    emb_cols = [col[f"embedding_{i}"] for i in range(EMBEDDING_DIM)]
+
+    def get(row, name):
+        i = col.get(name)
+        return row[i] if i is not None and i < len(row) else None
+
+    lines = []
+    for row in rows:
+        title = get(row, "title")
+        if not title:
+            continue
+
+        raw = [row[i] for i in emb_cols]
+        if all(raw):
+            embedding = "[" + ",".join(repr(float(x)) for x in raw) + "]"
+        else:
+            embedding = None
+
+        lines.append("\t".join((
+            _copy_escape(title.strip()),
+            _copy_number(get(row, "startYear"), int),
+            _copy_number(get(row, "imdb_rating"), float),
+            _copy_number(get(row, "imdb_votes"), int),
+            _copy_escape(get(row, "overview") or ""),
+            _copy_escape(get(row, "tmdb_genres") or ""),
+            _copy_escape(get(row, "poster_path")),
+            _copy_escape(embedding),
+        )))
+
+    return "".join(line + "\n" for line in lines), len(lines)
+
+
+def iter_row_chunks(reader: Iterable[List[str]], size: int) -> Iterator[List[List[str]]]:
+    chunk = []
+    for row in reader:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def parallel_convert(header, chunks, workers: int) -> Iterator[tuple]:
+    """Ordered map over chunks with a bounded number of chunks in flight."""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(convert_chunk, header, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class ChunkStream:
+    """
+    File-like adapter so psycopg2's copy_expert can pull converted chunks.
+    Reads are served from a memoryview of the current chunk, so each one
+    copies only the bytes it returns; reads may come back short.
+    """
+
+    def __init__(self, chunks: Iterator[tuple]):
+        self._chunks = chunks
+        self._current = memoryview(b"")
+        self.rows = 0
+
+    def _next_chunk(self) -> bool:
+        while not self._current:
+            try:
+                data, n = next(self._chunks)
+            except StopIteration:
+                return False
+            self._current = memoryview(data.encode("utf-8"))
+            self.rows += n
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            parts = []
+            while self._next_chunk():
+                parts.append(bytes(self._current))
+                self._current = memoryview(b"")
+            return b"".join(parts)
+        if size == 0 or not self._next_chunk():
+            return b""
+        out, self._current = self._current[:size], self._current[size:]
+        return bytes(out)
+
+    readline = read
+
+
+def _secondary_indexes(cur) -> List[tuple]:
+    """Indexes on movies that don't back a constraint (and aren't the ANN index)."""
+    cur.execute(
+        """
+        SELECT indexname, indexdef FROM pg_indexes
+        WHERE tablename = 'movies'
+          AND indexname <> %s
+          AND indexname NOT IN (
+              SELECT conname FROM pg_constraint WHERE conrelid = 'movies'::regclass
+          )
+        """,
+        (INDEX_NAME,),
+    )
+    return cur.fetchall()
+
+
+def copy_chunks_into_movies(chunks: Iterator[tuple], offline: bool = False) -> int:
+    """
+    Stream COPY-formatted chunks into an empty movies table and fill their
+    scores, in one transaction. Returns the number of rows loaded, 0 if
+    another initializer got there first.
+
+    With `offline`, secondary indexes are dropped for the load and rebuilt
+    afterwards. DROP INDEX locks movies against every reader until commit,
+    so only pass it when nothing is serving from the database.
+    """
+    with engine.begin() as conn:
+        cur = conn.connection.cursor()
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (_INIT_LOCK_KEY,))
+        cur.execute("SELECT 1 FROM movies LIMIT 1")
+        if cur.fetchone() is not None:
+            return 0
+
+        # Build secondary indexes once after the load instead of per row
+        indexes = _secondary_indexes(cur) if offline else []
+        for name, _ in indexes:
+            cur.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+        stream = ChunkStream(chunks)
+        columns = ", ".join(f'"{c}"' for c in COPY_COLUMNS)
+        cur.copy_expert(f"COPY movies ({columns}) FROM STDIN", stream)
+
+        # Before the commit, so the API never snapshots unscored rows, and
+        # before ix_movies_random_pool (on sample_weight) is rebuilt
+        refresh_movie_scores(conn)
+
+        for _, indexdef in indexes:
+            cur.execute(indexdef)
+
+        return stream.rows
+
+
+def _export_copy_chunks(export: CatalogExport) -> Iterator[tuple]:
+    """COPY text for `movies_import`, straight from the memory-mapped columns."""
+    for rows in export.iter_rows(COPY_CHUNK_ROWS):
+        lines = []
+        for (movie_id, year, rating, votes, title, overview, genres, poster, emb) in rows:
+            embedding = None if emb is None else "[" + ",".join(repr(float(x)) for x in emb) + "]"
+            lines.append("\t".join((
+                str(movie_id),
+                _copy_escape(title),
+                _copy_number(year, int),
+                _copy_number(rating, float),
+                _copy_number(votes, int),
+                _copy_escape(overview),
+                _copy_escape(genres),
+                _copy_escape(poster),
+                _copy_escape(embedding),
+            )))
+        yield "".join(line + "\n" for line in lines), len(lines)
+
+
+def load_from_export(export_path: Path) -> int:
+    """
+    Load (or top up) movies from a columnar export. Rows go through a temp
+    table so ids already in the database are skipped, and are scored in the
+    same transaction. Returns rows inserted.
+    """
+    export = CatalogExport(export_path)
+    columns = ", ".join(f'"{c}"' for c in ("id",) + COPY_COLUMNS)
+
+    with engine.begin() as conn:
+        cur = conn.connection.cursor()
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (_INIT_LOCK_KEY,))
+        cur.execute(
+            f"CREATE TEMP TABLE movies_import ON COMMIT DROP AS "
+            f"SELECT {columns} FROM movies WITH NO DATA"
+        )
+        stream = ChunkStream(_export_copy_chunks(export))
+        cur.copy_expert(f"COPY movies_import ({columns}) FROM STDIN", stream)
+        cur.execute(
+            f"INSERT INTO movies ({columns}) SELECT {columns} FROM movies_import "
+            f"ON CONFLICT (id) DO NOTHING"
+        )
+        inserted = cur.rowcount
+        # Keep the serial ahead of the imported ids
+        cur.execute(
+            "SELECT setval(pg_get_serial_sequence('movies', 'id'), "
+            "GREATEST((SELECT max(id) FROM movies), 1))"
+        )
+        refresh_movie_scores(conn)
+
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE movies"))
+    return inserted
 
 
-        print(f"Inserted {total_inserted} movies into the database.")
+def load_with_copy(tsv_path: Path, workers: int, offline: bool = False) -> int:
+    with tsv_path.open(newline="", encoding="utf-8") as f:
+        reader = csv.reader(f, delimiter="\t")
+        header = next(reader)
+        chunks = iter_row_chunks(reader, COPY_CHUNK_ROWS)
+        loaded = copy_chunks_into_movies(parallel_convert(header, chunks, workers), offline)
 
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE movies"))
+    return loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load movies.tsv into Postgres.")
+    parser.add_argument("--mode", choices=["copy", "orm"], default=INIT_DB_MODE)
+    parser.add_argument("--tsv", type=Path, default=TSV_PATH)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--from-export", type=Path, default=None,
+                        help="load from a columnar export directory instead of the TSV")
+    parser.add_argument("--offline", action="store_true",
+                        help="nothing is serving from the database: drop indexes during a copy load")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    wait_for_db()
+
+    # Ensure pgvector is enabled
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+
+    # Ensure tables exist BEFORE querying them
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        run_migrations(conn)
+
+    if args.from_export is not None:
+        start = time.perf_counter()
+        inserted = load_from_export(args.from_export)
+        elapsed = time.perf_counter() - start
+        print(f"Inserted {inserted} movies from {args.from_export} in {elapsed:.1f}s.")
+        with engine.begin() as conn:
+            ensure_embedding_index(conn)
+        return
+
+    db: Session = SessionLocal()
+    try:
+        # Idempotency guard
+        if database_already_initialized(db):
+            print("Database already initialized. Exiting init.")
+            return
     finally:
         db.close()
 
+    start = time.perf_counter()
+    if args.mode == "copy":
+        total_inserted = load_with_copy(args.tsv, args.workers, args.offline)
+    else:
+        total_inserted = load_with_orm(args.tsv)
+    elapsed = time.perf_counter() - start
+
+    rate = total_inserted / elapsed if elapsed > 0 else 0.0
+    print(
+        f"Inserted {total_inserted} movies into the database "
+        f"in {elapsed:.1f}s ({rate:,.0f} rows/sec, mode={args.mode})."
+    )
+
+    # Build the ANN index once, after the bulk insert
+    with engine.begin() as conn:
+        ensure_embedding_index(conn)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,236 @@
+"""
+Closed-loop load test for the hot API routes.
+
+    python -m app.scripts.load_test \
+        --target sync=http://localhost:8000 --target async=http://localhost:8001 \
+        [--scenario random|smart|rate|me] [--slo-ms 100] [--duration 10]
+        [--concurrency 1,2,4,8,16,32,64] [--json]
+
+Run one API per DB_DRIVER setting against the same database and give each
+one a --target. For every concurrency level, N clients loop on the scenario
+over keep-alive connections for --duration seconds. The report lists
+requests/sec and latency percentiles per level, and the highest
+requests/sec each target sustained with p95 latency within --slo-ms.
+
+Each client registers its own throwaway user first, so rating scenarios
+don't contend on one user's rows. Standard library only.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+SCENARIOS = ("random", "smart", "rate", "me")
+
+
+class HttpClient:
+    """Minimal HTTP/1.1 keep-alive client with a cookie jar of one cookie."""
+
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 80
+        self.cookie: Optional[str] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+    async def request(self, method: str, path: str, payload=None) -> Tuple[int, bytes]:
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        head = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            f"Content-Length: {len(body)}",
+            "Content-Type: application/json",
+        ]
+        if self.cookie:
+            head.append(f"Cookie: access_token={self.cookie}")
+        data = ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body
+
+        for attempt in range(2):
+            if self._writer is None:
+                await self._connect()
+            try:
+                self._writer.write(data)
+                await self._writer.drain()
+                return await self._read_response()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if attempt:
+                    raise
+        raise ConnectionError("unreachable")
+
+    async def _read_response(self) -> Tuple[int, bytes]:
+        status_line = await self._reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = await self._reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name, value = name.strip().lower(), value.strip()
+            if name == "set-cookie" and value.startswith("access_token="):
+                self.cookie = value.split(";", 1)[0].split("=", 1)[1]
+            headers[name] = value
+
+        if headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while True:
+                size = int((await self._reader.readuntil(b"\r\n")).strip(), 16)
+                chunk = await self._reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                chunks.append(chunk[:-2])
+            body = b"".join(chunks)
+        else:
+            body = await self._reader.readexactly(int(headers.get("content-length", "0")))
+
+        if headers.get("connection") == "close":
+            await self.close()
+        return status, body
+
+
+async def register(client: HttpClient) -> None:
+    name = f"load_{uuid.uuid4().hex[:12]}"
+    status, body = await client.request(
+        "POST",
+        "/auth/register",
+        {"username": name, "email": f"{name}@example.com", "password": uuid.uuid4().hex},
+    )
+    if status != 200 or not client.cookie:
+        raise RuntimeError(f"registration failed ({status}): {body[:200]!r}")
+
+
+async def run_scenario_once(client: HttpClient, scenario: str, latencies: List[float]) -> int:
+    """One iteration; appends one latency per request. Returns the error count."""
+    async def timed(method, path, payload=None):
+        start = time.perf_counter()
+        status, body = await client.request(method, path, payload)
+        latencies.append(time.perf_counter() - start)
+        return status, body
+
+    if scenario == "me":
+        status, _ = await timed("GET", "/auth/me")
+        return int(status != 200)
+
+    mode = "smart" if scenario == "smart" else "random"
+    status, body = await timed("GET", f"/movies/random?mode={mode}")
+    if status != 200:
+        return 1
+    if scenario == "rate":
+        movie_id = json.loads(body)["id"]
+        status, _ = await timed("POST", "/movies/rate", {"movie_id": movie_id, "rating": True})
+        return int(status != 200)
+    return 0
+
+
+async def run_level(clients: List[HttpClient], scenario: str, duration: float) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            try:
+                errors += await run_scenario_once(client, scenario, latencies)
+            except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(c) for c in clients))
+    elapsed = time.perf_counter() - start
+
+    lat_ms = np.array(latencies) * 1000.0 if latencies else np.zeros(1)
+    return {
+        "concurrency": len(clients),
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": float(np.percentile(lat_ms, 50)),
+        "p95_ms": float(np.percentile(lat_ms, 95)),
+        "p99_ms": float(np.percentile(lat_ms, 99)),
+    }
+
+
+async def run_target(name: str, url: str, args) -> dict:
+    levels = sorted(args.concurrency)
+    clients = [HttpClient(url) for _ in range(levels[-1])]
+    for client in clients:
+        await register(client)
+
+    results = []
+    try:
+        for level in levels:
+            result = await run_level(clients[:level], args.scenario, args.duration)
+            results.append(result)
+            print(
+                f"[{name}] c={level:<4} {result['rps']:9.1f} req/s  "
+                f"p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms  "
+                f"p99 {result['p99_ms']:7.1f} ms  errors {result['errors']}"
+            )
+    finally:
+        for client in clients:
+            await client.close()
+
+    within = [r for r in results if r["p95_ms"] <= args.slo_ms and r["errors"] == 0]
+    best = max(within, key=lambda r: r["rps"]) if within else None
+    return {"target": name, "url": url, "levels": results, "best_within_slo": best}
+
+
+def parse_target(value: str) -> Tuple[str, str]:
+    name, sep, url = value.partition("=")
+    return (name, url) if sep else (value, value)
+
+
+async def amain(args) -> List[dict]:
+    return [await run_target(name, url, args) for name, url in args.target]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare API throughput at a latency SLO.")
+    parser.add_argument("--target", type=parse_target, action="append", required=True,
+                        help="name=base_url, repeatable")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="random")
+    parser.add_argument("--slo-ms", type=float, default=100.0, help="p95 latency budget")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--concurrency", type=lambda s: [int(x) for x in s.split(",")],
+                        default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    reports = asyncio.run(amain(args))
+
+    print()
+    print(f"Max throughput with p95 <= {args.slo_ms:g} ms ({args.scenario}):")
+    for report in reports:
+        best = report["best_within_slo"]
+        if best is None:
+            print(f"  {report['target']:<10} none of the levels met the SLO")
+        else:
+            print(
+                f"  {report['target']:<10} {best['rps']:9.1f} req/s "
+                f"at c={best['concurrency']} (p95 {best['p95_ms']:.1f} ms)"
+            )
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Recompute the stored movie scores (movies.quality_score, sample_weight).
+
+    python -m app.scripts.reweight_movies
+
+Run it after changing a formula in app/scoring.py. Catalog loads fill
+the scores on their own. Only rows whose values change are rewritten.
+
+The SQL recommendation paths pick up the new values immediately. The
+refresh also bumps the scores version in catalog_meta, so the in-memory
+snapshots of running API workers (the random sampler and
+SMART_ENGINE=numpy) are rebuilt within CATALOG_CHECK_SECONDS.
+"""
+
+import logging
+import time
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.migrations import run_migrations
+from app.scoring import refresh_movie_scores
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    with engine.begin() as conn:
+        run_migrations(conn)
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        updated = refresh_movie_scores(conn)
+    elapsed = time.perf_counter() - start
+    print(f"Updated scores for {updated} movies in {elapsed:.1f}s.")
+
+    if updated:
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE movies"))
+
+
+if __name__ == "__main__":
+    main()
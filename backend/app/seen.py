@@ -0,0 +1,129 @@
+"""
+Per-user "seen" sets: the ids of every movie a user has rated.
+
+Each set is a sorted int32 array, so membership is a binary search and
+excluding seen movies from a batch of candidates is one vectorized mask
+instead of a NOT IN anti-join. Sets are cached in-process with LRU
+eviction and kept current by the rating write paths.
+
+Other worker processes don't see those updates, so entries also expire
+after SEEN_CACHE_TTL_SECONDS and are reloaded with one index scan. Until
+then recommend_ids (routers/movie_routes.py) re-checks what it picked
+against ratings and clears a stale entry itself.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+
+SEEN_CACHE_SIZE = int(os.getenv("SEEN_CACHE_SIZE", "10000"))
+SEEN_CACHE_TTL_SECONDS = float(os.getenv("SEEN_CACHE_TTL_SECONDS", "300"))
+
+
+class SeenSet:
+    __slots__ = ("ids",)
+
+    def __init__(self, ids: Iterable[int] = ()):
+        self.ids = np.unique(np.fromiter(ids, dtype=np.int32))
+
+    def __len__(self) -> int:
+        return int(self.ids.shape[0])
+
+    def __contains__(self, movie_id: int) -> bool:
+        i = int(np.searchsorted(self.ids, movie_id))
+        return i < len(self) and int(self.ids[i]) == movie_id
+
+    def mask(self, movie_ids: Sequence[int]) -> np.ndarray:
+        """Boolean array, True where the movie id is seen."""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        if len(self) == 0 or movie_ids.size == 0:
+            return np.zeros(movie_ids.shape, dtype=bool)
+        pos = np.clip(np.searchsorted(self.ids, movie_ids), 0, len(self) - 1)
+        return self.ids[pos] == movie_ids
+
+    def first_unseen(self, movie_ids: Sequence[int]) -> Optional[int]:
+        """First id (in the given order) that is not seen."""
+        if len(movie_ids) == 0:
+            return None
+        unseen = np.flatnonzero(~self.mask(movie_ids))
+        return int(movie_ids[unseen[0]]) if unseen.size else None
+
+    def unseen(self, movie_ids: Sequence[int], limit: Optional[int] = None) -> List[int]:
+        """Ids that are not seen, in the given order, at most `limit`."""
+        if len(movie_ids) == 0:
+            return []
+        unseen = np.flatnonzero(~self.mask(movie_ids))
+        if limit is not None:
+            unseen = unseen[:limit]
+        return [int(movie_ids[i]) for i in unseen]
+
+    def with_added(self, movie_id: int) -> "SeenSet":
+        if movie_id in self:
+            return self
+        out = SeenSet()
+        i = int(np.searchsorted(self.ids, movie_id))
+        out.ids = np.insert(self.ids, i, np.int32(movie_id))
+        return out
+
+
+def load_seen_set(db: Session, user_id: int) -> SeenSet:
+    return SeenSet(
+        db.execute(
+            select(models.Rating.movie_id).where(models.Rating.user_id == user_id)
+        ).scalars()
+    )
+
+
+class SeenSetCache:
+    def __init__(self, max_size: int = SEEN_CACHE_SIZE, ttl: float = SEEN_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+
+    def get(self, db: Session, user_id: int) -> SeenSet:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                return entry[0]
+
+        seen = load_seen_set(db, user_id)
+        self._put(user_id, seen, now)
+        return seen
+
+    def _put(self, user_id: int, seen: SeenSet, loaded_at: float) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (seen, loaded_at)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def add(self, user_id: int, movie_id: int) -> None:
+        """Record a new rating; a no-op for users that aren't cached."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries[user_id] = (entry[0].with_added(movie_id), entry[1])
+
+    def clear(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+seen_cache = SeenSetCache()
+
+
+def get_seen_set(db: Session, user_id: int) -> SeenSet:
+    return seen_cache.get(db, user_id)
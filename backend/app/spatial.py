@@ -0,0 +1,111 @@
+"""
+Grid index over the 2D movie map for viewport / level-of-detail queries.
+
+Points are bucketed into a RESOLUTION x RESOLUTION grid and stored cell by
+cell (CSR layout), most popular first inside each cell. A bounding-box query
+touches one contiguous slice per grid row. Below SPACE_MAX_ZOOM the result is
+thinned to the `per_cell` most popular points of each level-of-detail cell,
+where zoom z splits the full map into LOD_CELLS * 2**z cells per axis; at
+SPACE_MAX_ZOOM and above every point in view is returned.
+
+SPACE_GRID_RESOLUTION and SPACE_LOD_CELLS must be powers of two.
+"""
+
+import os
+from typing import Tuple
+
+import numpy as np
+
+SPACE_GRID_RESOLUTION = int(os.getenv("SPACE_GRID_RESOLUTION", "256"))
+SPACE_LOD_CELLS = int(os.getenv("SPACE_LOD_CELLS", "16"))
+SPACE_MAX_ZOOM = int(os.getenv("SPACE_MAX_ZOOM", "4"))
+
+
+class SpatialGrid:
+    def __init__(
+        self,
+        coords: np.ndarray,
+        popularity: np.ndarray,
+        resolution: int = SPACE_GRID_RESOLUTION,
+    ):
+        coords = np.asarray(coords, dtype=np.float32)
+        self.coords = coords
+        self.popularity = np.asarray(popularity, dtype=np.float64)
+        self.resolution = resolution
+
+        if len(coords):
+            self.lo = coords.min(axis=0)
+            self.hi = coords.max(axis=0)
+        else:
+            self.lo = self.hi = np.zeros(2, dtype=np.float32)
+        span = self.hi - self.lo
+        self.cell_size = np.where(span > 0, span / resolution, 1.0)
+
+        self.cx, self.cy = self._cells(coords)
+        cell = self.cy.astype(np.int64) * resolution + self.cx
+        self.order = np.lexsort((-self.popularity, cell))
+        self.starts = np.searchsorted(cell[self.order], np.arange(resolution * resolution + 1))
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        return float(self.lo[0]), float(self.lo[1]), float(self.hi[0]), float(self.hi[1])
+
+    def _cells(self, xy: np.ndarray):
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        idx = np.floor((xy - self.lo) / self.cell_size).astype(np.int64)
+        idx = np.clip(idx, 0, self.resolution - 1)
+        return idx[:, 0], idx[:, 1]
+
+    def query(
+        self,
+        xmin: float,
+        ymin: float,
+        xmax: float,
+        ymax: float,
+        zoom: int = 0,
+        per_cell: int = 4,
+        limit: int = 5000,
+    ) -> Tuple[np.ndarray, bool]:
+        """
+        Point indices inside the box, thinned for the zoom level.
+        Returns (indices, exact) where exact means nothing was dropped.
+        """
+        if len(self.coords) == 0 or xmin > xmax or ymin > ymax:
+            return np.empty(0, dtype=np.int64), True
+
+        (ix0, ix1), (iy0, iy1) = self._cells([[xmin, ymin], [xmax, ymax]])
+        res = self.resolution
+        slices = [
+            self.order[self.starts[row * res + ix0]:self.starts[row * res + ix1 + 1]]
+            for row in range(int(iy0), int(iy1) + 1)
+        ]
+        cand = np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+        xy = self.coords[cand]
+        inside = (
+            (xy[:, 0] >= xmin) & (xy[:, 0] <= xmax)
+            & (xy[:, 1] >= ymin) & (xy[:, 1] <= ymax)
+        )
+        cand = cand[inside]
+        total = len(cand)
+
+        if zoom < SPACE_MAX_ZOOM and total:
+            cand = self._thin(cand, zoom, per_cell)
+
+        if len(cand) > limit:
+            top = np.argpartition(-self.popularity[cand], limit - 1)[:limit]
+            cand = cand[top]
+
+        return cand, len(cand) == total
+
+    def _thin(self, cand: np.ndarray, zoom: int, per_cell: int) -> np.ndarray:
+        """Keep the `per_cell` most popular points of each LOD cell."""
+        lod = min(self.resolution, SPACE_LOD_CELLS * (2 ** max(zoom, 0)))
+        shift = int(np.log2(self.resolution // lod)) if lod < self.resolution else 0
+
+        key = (self.cy[cand] >> shift) * lod + (self.cx[cand] >> shift)
+        ordered = np.lexsort((-self.popularity[cand], key))
+        key_sorted = key[ordered]
+        _, first, counts = np.unique(key_sorted, return_index=True, return_counts=True)
+        rank = np.arange(len(key_sorted)) - np.repeat(first, counts)
+        return cand[ordered[rank < per_cell]]
@@ -0,0 +1,135 @@
+"""
+Approximate nearest-neighbour index on movies.embedding.
+
+The index is managed from code instead of the model so its build parameters
+can be changed per deployment:
+
+    EMBEDDING_INDEX        hnsw | ivfflat | none        (default: none)
+    HNSW_M                 graph degree                 (default: 16)
+    HNSW_EF_CONSTRUCTION   build-time candidate list    (default: 64)
+    IVFFLAT_LISTS          number of lists, 0 = rows / 1000 (min 10)
+
+and searched with:
+
+    HNSW_EF_SEARCH         query-time candidate list    (default: 100)
+    IVFFLAT_PROBES         lists probed per query       (default: 10)
+    ANN_ITERATIVE_SCAN     pgvector >= 0.8 only, e.g. relaxed_order (default: off)
+
+The smart query only goes through the index when SMART_CANDIDATES > 0
+(see routers/movie_routes.py), so the two are set together, e.g.
+EMBEDDING_INDEX=hnsw SMART_CANDIDATES=200. With the defaults (none, 0) no
+index is built or maintained. app/scripts/benchmark_ann.py measures the
+recall/latency trade-off.
+"""
+
+import logging
+import os
+from typing import Dict
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+EMBEDDING_INDEX = os.getenv("EMBEDDING_INDEX", "none").lower()
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "0"))
+
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "100"))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+ANN_ITERATIVE_SCAN = os.getenv("ANN_ITERATIVE_SCAN", "").lower()
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "ix_movies_embedding_ann"
+
+# Serializes index DDL between the API startup hook and initialize_db
+_DDL_LOCK_KEY = 7_310_001
+
+
+def index_options(method: str, row_count: int) -> Dict[str, int]:
+    if method == "hnsw":
+        return {"m": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION}
+    if method == "ivfflat":
+        lists = IVFFLAT_LISTS or max(10, row_count // 1000)
+        return {"lists": lists}
+    raise ValueError(f"Unknown EMBEDDING_INDEX method: {method!r}")
+
+
+def _current_indexdef(conn: Connection):
+    return conn.execute(
+        text("SELECT indexdef FROM pg_indexes WHERE indexname = :name"),
+        {"name": INDEX_NAME},
+    ).scalar()
+
+
+def _matches(indexdef: str, method: str, options: Dict[str, int]) -> bool:
+    if f"USING {method} " not in indexdef:
+        return False
+    return all(f"{k}='{v}'" in indexdef for k, v in options.items())
+
+
+def ensure_embedding_index(conn: Connection, method: str = EMBEDDING_INDEX) -> bool:
+    """
+    Create, rebuild or drop the ANN index so it matches the configuration.
+    Skips the build while the catalog is empty (IVFFlat needs data to train
+    its lists, and loading into an HNSW graph row by row is slow), so
+    initialize_db calls this again once the load finishes.
+
+    Returns True if the index exists afterwards.
+    """
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _DDL_LOCK_KEY})
+    indexdef = _current_indexdef(conn)
+
+    if method == "none":
+        if indexdef is not None:
+            conn.execute(text(f"DROP INDEX IF EXISTS {INDEX_NAME}"))
+        return False
+
+    row_count = conn.execute(text("SELECT count(*) FROM movies")).scalar()
+    if not row_count:
+        return indexdef is not None
+
+    options = index_options(method, row_count)
+    if indexdef is not None:
+        # An auto-sized IVFFlat index isn't rebuilt just because the row count moved
+        pinned = {k: v for k, v in options.items() if not (k == "lists" and not IVFFLAT_LISTS)}
+        if _matches(indexdef, method, pinned):
+            return True
+        conn.execute(text(f"DROP INDEX IF EXISTS {INDEX_NAME}"))
+
+    with_clause = ", ".join(f"{k} = {int(v)}" for k, v in options.items())
+    logger.info("Building %s index on movies.embedding (%s)...", method, with_clause)
+    conn.execute(
+        text(
+            f"CREATE INDEX {INDEX_NAME} ON movies "
+            f"USING {method} (embedding vector_cosine_ops) WITH ({with_clause})"
+        )
+    )
+    return True
+
+
+def apply_search_settings(
+    db: Session,
+    k: int,
+    ef_search: int = HNSW_EF_SEARCH,
+    probes: int = IVFFLAT_PROBES,
+) -> None:
+    """
+    Transaction-local search parameters for the next ANN query. HNSW never
+    returns more than ef_search rows, so it is raised to at least k.
+    """
+    settings = {
+        "hnsw.ef_search": str(max(ef_search, k)),
+        "ivfflat.probes": str(probes),
+    }
+    if ANN_ITERATIVE_SCAN:
+        settings["hnsw.iterative_scan"] = ANN_ITERATIVE_SCAN
+        if ANN_ITERATIVE_SCAN == "relaxed_order":
+            settings["ivfflat.iterative_scan"] = ANN_ITERATIVE_SCAN
+
+    for name, value in settings.items():
+        db.execute(
+            text("SELECT set_config(:name, :value, true)"),
+            {"name": name, "value": value},
+        )
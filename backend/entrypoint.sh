@@ -2,7 +2,7 @@
 set -e
 
 echo "Starting background DB initialization..."
-python -m app.scripts.initialize_db || true &
+(python -m app.scripts.initialize_db && python -m app.scripts.build_movie_space) || true &
 
 echo "Starting API server..."
 PORT="${PORT:-8000}"
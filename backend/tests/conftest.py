@@ -0,0 +1,67 @@
+"""
+Shared fixtures. Run from backend/ with `python -m pytest -q tests`.
+
+Most tests run against a throwaway SQLite file (`engine`, `db`). The ones
+that need the real database, such as the query budgets, take `postgres`:
+a scratch Postgres with pgvector at DATABASE_URL, skipped when there is
+none to connect to.
+"""
+
+import os
+import tempfile
+
+# Artifacts the app writes while under test stay away from the real ones.
+# Set before any app module reads them at import.
+_ARTIFACTS = tempfile.mkdtemp(prefix="movie-recommender-tests-")
+os.environ.setdefault("MOVIE_SPACE_PATH", os.path.join(_ARTIFACTS, "movie_space.pkl"))
+os.environ.setdefault("EMBEDDING_STORE_DIR", os.path.join(_ARTIFACTS, "embedding_store"))
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import database, models  # noqa: F401  (models registers the tables)
+from app.migrations import run_migrations
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # A file database gets a QueuePool, so checkedout() means what it does
+    # on Postgres
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    database.Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    db = sessionmaker(bind=engine, autoflush=False, future=True)()
+    yield db
+    db.close()
+
+
+@pytest.fixture(scope="session")
+def postgres():
+    """The app's own engine, migrated, once DATABASE_URL answers."""
+    if database.engine.dialect.name != "postgresql":
+        pytest.skip("DATABASE_URL is not a Postgres database")
+    probe = create_engine(database.DATABASE_URL, connect_args={"connect_timeout": 3})
+    try:
+        with probe.connect():
+            pass
+    except OperationalError as exc:
+        pytest.skip(f"no Postgres at DATABASE_URL: {exc.orig}")
+    finally:
+        probe.dispose()
+
+    with database.engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+    database.Base.metadata.create_all(bind=database.engine)
+    with database.engine.begin() as conn:
+        run_migrations(conn)
+    return database.engine
@@ -0,0 +1,78 @@
+"""
+register and login must not hold a pooled connection while they wait on
+bcrypt, and the hasher's gauges must settle however a job ends.
+"""
+
+import asyncio
+import threading
+
+import pytest
+from fastapi import Response
+
+from app import auth, models, schemas
+from app.routers import auth_routes
+
+
+@pytest.fixture
+def checked_out(engine, monkeypatch):
+    """Pool checkouts seen by each (fake) hasher call."""
+    seen = []
+
+    async def verify(plain_password, hashed_password):
+        seen.append(engine.pool.checkedout())
+        return auth.verify_password(plain_password, hashed_password)
+
+    async def hash_password(password):
+        seen.append(engine.pool.checkedout())
+        return "hashed:" + password
+
+    monkeypatch.setattr(auth, "verify_password_async", verify)
+    monkeypatch.setattr(auth, "hash_password_async", hash_password)
+    return seen
+
+
+def test_login_releases_connection_during_verify(db, checked_out):
+    db.add(models.User(
+        username="alice",
+        email="alice@example.com",
+        password_hash=auth.get_password_hash("secret"),
+    ))
+    db.commit()
+
+    creds = schemas.UserLogin(username_or_email="alice", password="secret")
+    user = asyncio.run(auth_routes.login(creds, Response(), db))
+
+    assert checked_out == [0]
+    assert user.username == "alice"
+    assert user.email == "alice@example.com"
+
+
+def test_register_releases_connection_during_hash(db, checked_out):
+    user_in = schemas.UserCreate(username="bob", email="bob@example.com", password="secret")
+    user = asyncio.run(auth_routes.register_user(user_in, Response(), db))
+
+    assert checked_out == [0]
+    assert user.id is not None
+    assert user.password_hash == "hashed:secret"
+
+
+def test_hash_jobs_cancelled_before_starting_leave_the_queue():
+    hasher = auth.PasswordHasher(workers=1, max_queue=4)
+    release = threading.Event()
+    depth, in_flight = auth.HASH_QUEUE_DEPTH.value(), auth.HASH_IN_FLIGHT.value()
+
+    async def scenario():
+        running = asyncio.ensure_future(hasher.submit("verify", release.wait, 5))
+        queued = asyncio.ensure_future(hasher.submit("verify", release.wait, 5))
+        await asyncio.sleep(0.05)
+        queued.cancel()  # the client went away while the job was still waiting
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        release.set()
+        assert await running is True
+
+    asyncio.run(scenario())
+    hasher._executor.shutdown(wait=True)
+
+    assert auth.HASH_QUEUE_DEPTH.value() == depth
+    assert auth.HASH_IN_FLIGHT.value() == in_flight
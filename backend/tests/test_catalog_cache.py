@@ -0,0 +1,37 @@
+"""
+CatalogCache on the async path: callers inside AsyncSession.run_sync must
+never wait on the cache lock, even while the cache is cold.
+"""
+
+import contextlib
+import threading
+
+from app import catalog
+
+
+def test_async_callers_get_cold_value_while_building_off_thread(monkeypatch):
+    release = threading.Event()
+    built = threading.Event()
+    build_threads = []
+
+    def build(db, version):
+        build_threads.append(threading.current_thread().name)
+        release.wait(5)
+        built.set()
+        return "snapshot"
+
+    monkeypatch.setattr(catalog, "in_async_session", lambda: True)
+    monkeypatch.setattr(catalog, "SessionLocal", lambda: contextlib.nullcontext("db"))
+    cache = catalog.CatalogCache(build, read_version=lambda db: (10, 10))
+
+    # Cold, with a build in flight: neither call blocks, both see no value
+    assert cache.get("request db") is None
+    assert cache.get("request db") is None
+
+    monkeypatch.setattr(catalog, "in_async_session", lambda: False)
+    release.set()
+    assert built.wait(5)
+    cache._background.join(5)
+
+    assert cache.get("request db") == "snapshot"
+    assert build_threads == ["catalog-cache"]
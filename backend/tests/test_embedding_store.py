@@ -0,0 +1,50 @@
+"""
+The embedding store must be rebuilt when embeddings change in place: same
+ids, new vectors, so only the embeddings version in catalog_meta moves.
+"""
+
+import numpy as np
+import pytest
+from sqlalchemy import insert, update
+
+from app import models
+from app.catalog import EMBEDDINGS_VERSION_KEY, scored_catalog_version
+from app.embedding_store import get_embedding_store, open_embedding_store
+
+
+@pytest.fixture
+def movies(db):
+    rng = np.random.default_rng(5)
+    db.execute(insert(models.Movie), [
+        {"id": i, "title": f"Movie {i}", "embedding": rng.standard_normal(128).tolist()}
+        for i in (1, 2, 3)
+    ])
+    db.commit()
+
+
+def _bump_embeddings(db, movie_id, vector):
+    # What the movies trigger (app/migrations.py) does on Postgres
+    db.execute(update(models.Movie).where(models.Movie.id == movie_id).values(embedding=vector))
+    meta = db.get(models.CatalogMeta, EMBEDDINGS_VERSION_KEY)
+    if meta is None:
+        db.add(models.CatalogMeta(key=EMBEDDINGS_VERSION_KEY, value=1))
+    else:
+        meta.value += 1
+    db.commit()
+
+
+def test_in_place_embedding_update_rebuilds_the_store(db, movies, tmp_path):
+    root = tmp_path / "store"
+    before = scored_catalog_version(db)
+    store = get_embedding_store(db, before[:3], root)
+    assert before == (3, 3, 0, 0)
+
+    vector = np.full(128, 0.5, dtype=np.float32)
+    _bump_embeddings(db, 2, vector.tolist())
+    after = scored_catalog_version(db)
+
+    assert after[:2] == before[:2]
+    assert open_embedding_store(after[:3], root) is None
+    rebuilt = get_embedding_store(db, after[:3], root)
+    np.testing.assert_array_equal(rebuilt.embeddings[1], vector)
+    assert not np.array_equal(store.embeddings[1], vector)
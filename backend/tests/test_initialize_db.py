@@ -0,0 +1,28 @@
+"""ChunkStream, the file-like source the COPY loaders hand to psycopg2."""
+
+from app.scripts.initialize_db import ChunkStream
+
+CHUNKS = [("a\tb\n" * 3, 3), ("", 0), ("é\t\\N\n", 1), ("x" * 20000 + "\n", 1)]
+
+
+def _read_all(stream: ChunkStream, size: int) -> bytes:
+    parts = []
+    while True:
+        data = stream.read(size)
+        if not data:
+            return b"".join(parts)
+        assert len(data) <= size
+        parts.append(data)
+
+
+def test_sized_reads_return_every_byte_in_order():
+    stream = ChunkStream(iter(CHUNKS))
+    assert _read_all(stream, 8192) == "".join(text for text, _ in CHUNKS).encode("utf-8")
+    assert stream.rows == 5
+
+
+def test_unsized_read_drains_the_stream():
+    stream = ChunkStream(iter(CHUNKS))
+    head = stream.read(5)
+    assert head + stream.read() == "".join(text for text, _ in CHUNKS).encode("utf-8")
+    assert stream.read() == b""
@@ -0,0 +1,22 @@
+"""Pool checkout timing: measured by the pool, with lazy checkout kept."""
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.instrumentation import TimedQueuePool, collect_stats
+
+
+def test_checkout_wait_is_recorded_when_the_session_first_queries(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=TimedQueuePool)
+    db = sessionmaker(bind=engine, future=True)()
+    try:
+        with collect_stats() as stats:
+            assert engine.pool.checkedout() == 0
+            assert stats.pool_seconds == 0.0
+
+            db.execute(text("SELECT 1"))
+            assert engine.pool.checkedout() == 1
+            assert stats.pool_seconds > 0.0
+    finally:
+        db.close()
+        engine.dispose()
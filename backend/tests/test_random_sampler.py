@@ -0,0 +1,52 @@
+"""AliasSampler: the alias table, unseen draws and the exact fallback."""
+
+import numpy as np
+import pytest
+
+from app.random_sampler import AliasSampler
+from app.seen import SeenSet
+
+
+def _heavy_tailed(n, seed=1):
+    rng = np.random.default_rng(seed)
+    return np.minimum(np.exp(rng.normal(6.0, 2.2, n)), 3e6) ** 0.7
+
+
+@pytest.mark.parametrize("n", [1, 2, 7, 1000, 50_000])
+def test_alias_table_reproduces_the_weights(n):
+    weights = _heavy_tailed(n)
+    prob, alias = AliasSampler._build_alias(weights.copy())
+
+    assert np.all((prob >= 0) & (prob <= 1))
+    implied = (prob + np.bincount(alias, weights=1.0 - prob, minlength=n)) / n
+    np.testing.assert_allclose(implied, weights / weights.sum(), rtol=1e-9, atol=1e-15)
+
+
+def test_sample_unseen_many_is_distinct_and_unseen():
+    sampler = AliasSampler(np.arange(1, 2001, dtype=np.int32), _heavy_tailed(2000), seed=0)
+    for seen in (SeenSet(), SeenSet(range(1, 1990)), SeenSet(range(1, 1001))):
+        picked = sampler.sample_unseen_many(seen, 20)
+        assert len(picked) == min(20, 2000 - len(seen))
+        assert len(set(picked)) == len(picked)
+        assert not any(movie_id in seen for movie_id in picked)
+
+    assert sampler.sample_unseen_many(SeenSet(range(1, 2001)), 5) == []
+
+
+def test_seen_movies_outside_the_pool_dont_force_the_exact_pass(monkeypatch):
+    sampler = AliasSampler(np.arange(1, 11, dtype=np.int32), np.ones(10), seed=0)
+
+    def exact(*args):
+        raise AssertionError("rejection sampling should have been used")
+
+    monkeypatch.setattr(sampler, "_sample_exact", exact)
+    # Many seen movies, none of them eligible for random mode
+    picked = sampler.sample_unseen_many(SeenSet(range(1000, 5000)), 3)
+    assert len(set(picked)) == 3
+
+
+def test_exact_pass_follows_the_weights():
+    sampler = AliasSampler(np.array([1, 2, 3], dtype=np.int32), np.array([1.0, 0.0001, 9.0]), seed=0)
+    # Over half the pool's weight is seen, so every pick comes from the exact pass
+    firsts = [sampler.sample_unseen_many(SeenSet([3]), 1)[0] for _ in range(2000)]
+    assert firsts.count(1) > 1900
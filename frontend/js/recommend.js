@@ -3,6 +3,10 @@ let currentMode = 'random'; // 'random' | 'smart'
 let ratingCount = 0;
 let currentMovieIsFavorite = false;
 
+// Movies the server queued after the current one; their posters are preloaded
+let upcoming = [];
+const PREFETCH_COUNT = 3;
+
 // LocalStorage key for one-time notification
 const LS_KEY_SMART_UNLOCK = "notif_smart_unlocked";
 
@@ -72,6 +76,62 @@ function updateModeToggleUI() {
   label.textContent = currentMode === 'random' ? 'Random' : 'Smart';
 }
 
+function renderMovie(movie) {
+  currentMovieId = movie.id;
+
+  currentMovieIsFavorite = !!movie.is_favorite;
+  updateStarButtonUI();
+
+  document.getElementById('movie-title').textContent = movie.title;
+
+  // Poster
+  const posterEl = document.getElementById('movie-poster');
+  if (movie.poster_path) {
+    posterEl.src = posterUrl(movie);
+    posterEl.classList.remove("d-none");
+  } else {
+    posterEl.classList.add("d-none");
+  }
+
+  document.getElementById('movie-overview').textContent =
+    movie.overview || "No description available.";
+
+  let info = "";
+  if (movie.startYear || movie.imdb_rating || movie.imdb_votes) {
+    info =
+      `The movie was released in <strong>${movie.startYear ?? "N/A"}</strong> `
+      + `with an <strong>${movie.imdb_rating ?? "N/A"}</strong> on IMDB, `
+      + `rated by <strong>${movie.imdb_votes ?? "N/A"}</strong> viewers.`;
+  }
+
+  document.getElementById('movie-info').innerHTML = info;
+
+  setButtonsEnabled(true);
+}
+
+function posterUrl(movie) {
+  return movie.poster_path ? `https://image.tmdb.org/t/p/w500/${movie.poster_path}` : null;
+}
+
+function preloadPosters(movies) {
+  for (const movie of movies) {
+    const url = posterUrl(movie);
+    if (url) new Image().src = url;
+  }
+}
+
+function setUpcoming(movies) {
+  upcoming = movies || [];
+  preloadPosters(upcoming);
+}
+
+function showNoMoreMovies() {
+  currentMovieId = null;
+  document.getElementById('movie-title').textContent = 'No more movies available.';
+  document.getElementById('status-text').textContent = 'You have rated all available movies.';
+  setButtonsEnabled(false);
+}
+
 async function loadNextMovie() {
   const titleEl = document.getElementById('movie-title');
   const statusText = document.getElementById('status-text');
@@ -80,47 +140,17 @@ async function loadNextMovie() {
   setButtonsEnabled(false);
 
   try {
-    const movie = await apiFetch(`/movies/random?mode=${currentMode}`, {
+    const movies = await apiFetch(`/movies/next?mode=${currentMode}&count=${PREFETCH_COUNT}`, {
       method: 'GET',
     });
-    currentMovieId = movie.id;
-
-    currentMovieIsFavorite = !!movie.is_favorite;
-    updateStarButtonUI();
-
-    titleEl.textContent = movie.title;
-
-    // Poster
-    const posterEl = document.getElementById('movie-poster');
-    if (movie.poster_path) {
-      posterEl.src = `https://image.tmdb.org/t/p/w500/${movie.poster_path}`;
-      posterEl.classList.remove("d-none");
-    } else {
-      posterEl.classList.add("d-none");
-    }
-
-    document.getElementById('movie-overview').textContent =
-      movie.overview || "No description available.";
-
-    let info = "";
-    if (movie.startYear || movie.imdb_rating || movie.imdb_votes) {
-      info =
-        `The movie was released in <strong>${movie.startYear ?? "N/A"}</strong> `
-        + `with an <strong>${movie.imdb_rating ?? "N/A"}</strong> on IMDB, `
-        + `rated by <strong>${movie.imdb_votes ?? "N/A"}</strong> viewers.`;
+    if (!movies.length) {
+      showNoMoreMovies();
+      return;
     }
-
-    document.getElementById('movie-info').innerHTML = info;
-
-    setButtonsEnabled(true);
+    renderMovie(movies[0]);
+    setUpcoming(movies.slice(1));
 
   } catch (err) {
-    if (err.status === 404) {
-      titleEl.textContent = 'No more movies available.';
-      statusText.textContent = 'You have rated all available movies.';
-      setButtonsEnabled(false);
-      return;
-    }
     showAlert(err.data?.detail || err.message, 'danger');
     titleEl.textContent = 'Error loading movie.';
   }
@@ -130,20 +160,29 @@ async function sendRating(isUp) {
   if (!currentMovieId) return;
 
   const statusText = document.getElementById('status-text');
+  setButtonsEnabled(false);
 
   try {
-    await apiFetch('/movies/rate', {
+    // Saves the rating and returns the next movie in one round trip
+    const res = await apiFetch(`/movies/rate-next?mode=${currentMode}&count=${PREFETCH_COUNT}`, {
       method: 'POST',
       body: JSON.stringify({ movie_id: currentMovieId, rating: isUp }),
     });
 
-    statusText.textContent = 'Rating saved! Fetching next movie...';
     ratingCount++;
     updateUnlockState();
+    statusText.textContent = '';
 
-    await loadNextMovie();
+    if (res.next) {
+      renderMovie(res.next);
+      setUpcoming(res.upcoming);
+    } else {
+      setUpcoming([]);
+      showNoMoreMovies();
+    }
   } catch (err) {
     showAlert(err.data?.detail || err.message, 'danger');
+    setButtonsEnabled(true);
   }
 }
 